@@ -0,0 +1,176 @@
+import argparse
+import csv
+import glob
+import json
+import os
+
+import config
+import solvers
+from mapfile import BINARY_EXTENSION, POINTS_EXTENSION, load_map
+from util import SearchStats, SolverProcess, Timeout, profile_kinds
+
+FIELDS = ['map', 'coins', 'agent', 'repeat', 'status', 'time', 'peak_memory_kb', 'cost', 'gap']
+
+
+# only the solver part of an agent is made, so neither pygame nor any image is loaded
+def make_agent(agent_name, time_budget, stats=False):
+    agent = getattr(solvers, agent_name)()
+    agent.time_budget = time_budget
+    if stats:
+        agent.stats = SearchStats()
+    return agent
+
+
+def is_tour(coin_distance, path):
+    return path[0] == path[-1] == 0 and sorted(path[:-1]) == list(range(len(coin_distance)))
+
+
+# result of a closed solver, status - ok, timeout (cost is then the one of the last published incumbent),
+# memory (the solver ran out of its memory limit), error or invalid
+# time is the wall time from the start of the solver process until it was closed, peak memory is only known for
+# solvers that returned a result
+def solver_result(agent_name, agent, solver, coin_distance):
+    status, path = 'ok', None
+    if solver.error is not None:
+        status = 'memory' if 'MemoryError' in solver.error else 'error'
+    elif solver.result is not None:
+        path = solver.result[0]
+    else:
+        status, path = 'timeout', agent.incumbent
+
+    if path is not None and not is_tour(coin_distance, path):
+        status, path = 'invalid', None
+
+    result = {
+        'agent': agent_name,
+        'status': status,
+        'time': solver.end_time - solver.start_time,
+        'peak_memory_kb': 'unknown' if solver.peak_memory is None else solver.peak_memory,
+        'cost': None if path is None else coin_distance.path_cost(path),
+    }
+    if status == 'ok' and agent.stats is not None:
+        result['stats'] = agent.stats.as_dict()
+    return result
+
+
+# stats - whether to collect the agent's search counters, they are only in JSON results
+# memory_limit - bytes of address space the solver may use
+# profile - (report path prefix, profile kinds) to profile the solve with, None to run it as it is
+def run_agent(agent_name, coin_distance, time_limit, context='spawn', stats=False, memory_limit=None, profile=None):
+    agent = make_agent(agent_name, time_limit, stats)
+    solver = SolverProcess(time_limit, agent, coin_distance, context, memory_limit, profile)
+    try:
+        solver.start()
+        while not solver.wait(time_limit):
+            pass
+    except Timeout:
+        pass
+    finally:
+        solver.close()
+
+    return solver_result(agent_name, agent, solver, coin_distance)
+
+
+# unique name of a map file that keeps its extension, relative to the map folder for maps in it
+# (best known costs of one map file are stored under it, so two maps must never share one)
+def map_label(map_name):
+    path = os.path.relpath(map_name, config.MAP_FOLDER)
+    if path.startswith(os.pardir):
+        path = os.path.abspath(map_name)
+    return path.replace(os.sep, '/')
+
+
+# report path prefix of a profiled run, repeats after the first one get their number appended
+# return value - argument for SolverProcess, None if kinds is empty
+def profile_prefix(kinds, name, agent_name, repeat=0, folder=config.PROFILE_FOLDER):
+    if not kinds:
+        return None
+    name = name.strip('/').replace('/', '_')
+    return os.path.join(folder, f'{name}-{agent_name}' + (f'-{repeat}' if repeat else '')), kinds
+
+
+def print_result(result):
+    print(f'{result["map"]:>12} {result["agent"]:>14} #{result["repeat"]} {result["status"]:>8} '
+          f'cost {result["cost"]} time {result["time"]:.3f}s')
+
+
+# improves best_known with the results and sets the gap of every result to the best cost of its map
+def set_gaps(results, best_known):
+    for result in results:
+        if result['cost'] is not None and result['cost'] < best_known.get(result['map'], float('inf')):
+            best_known[result['map']] = result['cost']
+
+    for result in results:
+        best = best_known.get(result['map'])
+        if result['cost'] is not None and best:
+            result['gap'] = (result['cost'] - best) / best
+        else:
+            result['gap'] = None
+
+
+# best_known - map label (see map_label) to the best known tour cost, improved by the results of this run
+# profile - kinds of profiles to write for every run, see util.profiled
+def run_benchmark(agent_names, map_names, repeats=1, time_limit=60., best_known=None, stats=False, profile=()):
+    best_known = dict(best_known or {})
+    results = []
+    for map_name in map_names:
+        _, _, coin_distance = load_map(map_name)
+        for agent_name in agent_names:
+            for repeat in range(repeats):
+                name = map_label(map_name)
+                result = run_agent(agent_name, coin_distance, time_limit, stats=stats,
+                                   profile=profile_prefix(profile, name, agent_name, repeat))
+                result.update(map=name, coins=len(coin_distance) - 1, repeat=repeat)
+                results.append(result)
+                print_result(result)
+
+    set_gaps(results, best_known)
+    return results, best_known
+
+
+def default_maps():
+    return sorted(glob.glob(os.path.join(config.MAP_FOLDER, '*.txt')) +
+                  glob.glob(os.path.join(config.MAP_FOLDER, '*' + POINTS_EXTENSION)) +
+                  glob.glob(os.path.join(config.MAP_FOLDER, '*' + BINARY_EXTENSION)))
+
+
+def write_results(results, output):
+    with open(output, 'w', newline='') as f:
+        if output.endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows({field: result.get(field) for field in FIELDS} for result in results)
+        else:
+            json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs Pytnik agents over maps without opening a window.')
+    parser.add_argument('-a', '--agents', nargs='+', required=True, help='agent class names from solvers.py')
+    parser.add_argument('-m', '--maps', nargs='+', help='map files, all maps in the map folder by default')
+    parser.add_argument('-r', '--repeats', type=int, default=1)
+    parser.add_argument('-t', '--time-limit', type=float, default=60., help='seconds per run')
+    parser.add_argument('-b', '--best-known', help='JSON file mapping map labels to best known costs, updated in place')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='.json or .csv file for the results')
+    parser.add_argument('-s', '--stats', action='store_true', help='collect search counters (JSON output only)')
+    parser.add_argument('-p', '--profile', nargs='?', const='cpu,memory', default=config.PROFILE,
+                        help='profile the solves with cProfile and tracemalloc: cpu, memory or both (default)')
+    args = parser.parse_args()
+    maps = args.maps or default_maps()
+
+    best_known = None
+    if args.best_known and os.path.exists(args.best_known):
+        with open(args.best_known, 'r') as f:
+            best_known = json.load(f)
+
+    results, best_known = run_benchmark(args.agents, maps, args.repeats, args.time_limit, best_known,
+                                        args.stats or config.STATS, profile_kinds(args.profile))
+    write_results(results, args.output)
+
+    if args.best_known:
+        with open(args.best_known, 'w') as f:
+            json.dump(best_known, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
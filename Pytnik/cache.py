@@ -0,0 +1,87 @@
+import glob
+import json
+import os
+import tempfile
+
+import config
+from matrix import cost_matrix
+
+
+# solved tours kept on disk, one JSON file per map and agent
+# file name - coins, hash of the cost matrix, agent class name and agent version
+# the least recently used entries (by file modification time) are removed above max_entries
+class SolutionCache:
+    def __init__(self, folder=config.CACHE_FOLDER, max_entries=config.CACHE_SIZE):
+        self.folder = folder
+        self.max_entries = max_entries
+
+    @staticmethod
+    def digest(coin_distance):
+        return cost_matrix(coin_distance).digest()[:32]
+
+    def file_name(self, coin_distance, agent):
+        return os.path.join(self.folder, f'{len(coin_distance)}-{SolutionCache.digest(coin_distance)}-'
+                                         f'{type(agent).__name__}-{agent.version}.json')
+
+    @staticmethod
+    def read(file_name):
+        try:
+            with open(file_name, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # return value - dict with path, cost, time, optimal and stats, None if the agent never solved the map
+    def get(self, coin_distance, agent):
+        file_name = self.file_name(coin_distance, agent)
+        entry = SolutionCache.read(file_name)
+        if entry is not None:
+            os.utime(file_name)
+        return entry
+
+    def put(self, coin_distance, agent, path, elapsed):
+        os.makedirs(self.folder, exist_ok=True)
+        entry = {
+            'agent': type(agent).__name__,
+            'version': agent.version,
+            'path': list(path),
+            'cost': cost_matrix(coin_distance).path_cost(path),
+            'time': elapsed,
+            'optimal': agent.exact,
+            'stats': None if agent.stats is None else agent.stats.as_dict(),
+        }
+        # written to a temporary file first, so a reader never sees half an entry
+        fd, temporary = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temporary, self.file_name(coin_distance, agent))
+        self.evict()
+        return entry
+
+    def evict(self):
+        entries = glob.glob(os.path.join(self.folder, '*.json'))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for file_name in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(file_name)
+            except OSError:
+                pass
+
+    # every cached tour of a map with as many coins is a tour of this map as well,
+    # so its cost here bounds the optimum from above
+    # return value - cheapest such cost, None if there is no tour of the right size
+    def upper_bound(self, coin_distance):
+        coin_distance = cost_matrix(coin_distance)
+        bound = None
+        for file_name in glob.glob(os.path.join(self.folder, f'{len(coin_distance)}-*.json')):
+            entry = SolutionCache.read(file_name)
+            if entry is None:
+                continue
+            path = entry['path']
+            if path[0] == path[-1] == 0 and sorted(path[:-1]) == list(range(len(coin_distance))):
+                cost = coin_distance.path_cost(path)
+                if bound is None or cost < bound:
+                    bound = cost
+        return bound
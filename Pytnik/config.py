@@ -11,6 +11,8 @@ GAME_FONT = None
 INFO_FONT = None
 COIN_FONT = None
 RIBBON_HEIGHT = None
+# search counters of the agent, shown in the sidebar and printed as JSON, enabled with PYTNIK_STATS=1
+STATS = os.environ.get('PYTNIK_STATS', '0') not in ('', '0')
 
 # define colors
 WHITE = (255, 255, 255)
@@ -27,3 +29,14 @@ GAME_FOLDER = os.path.dirname(__file__)
 IMG_FOLDER = os.path.join(GAME_FOLDER, 'img')
 MAP_FOLDER = os.path.join(GAME_FOLDER, 'maps')
 FONT_FOLDER = os.path.join(GAME_FOLDER, 'fonts')
+
+# solved tours are reused across runs unless PYTNIK_CACHE=0, CACHE_SIZE is the number of kept tours
+CACHE = os.environ.get('PYTNIK_CACHE', '1') not in ('', '0')
+CACHE_FOLDER = os.path.join(GAME_FOLDER, 'cache')
+CACHE_SIZE = 256
+
+# solves are profiled with cProfile (cpu) and tracemalloc (memory) when PYTNIK_PROFILE or --profile is
+# cpu, memory or both (cpu,memory or 1), the reports are written to PROFILE_FOLDER as <map>-<agent>.pstats
+# and <map>-<agent>-memory.txt
+PROFILE = os.environ.get('PYTNIK_PROFILE', '')
+PROFILE_FOLDER = os.path.join(GAME_FOLDER, 'profiles')
@@ -1,14 +1,16 @@
+import json
 import os
 import sys
-import threading
 import time
-from queue import Queue
+from collections import OrderedDict
 
 import pygame
 
 import config
+import mapfile
+from cache import SolutionCache
 from sprites import Coin, CollectedCoin, Surface
-from util import TimedFunction, Timeout
+from util import SearchStats, SolverProcess, Timeout, profile_kinds
 
 
 class EndGame(Exception):
@@ -18,34 +20,14 @@ class EndGame(Exception):
 class Game:
     @staticmethod
     def load_map(map_name):
-        try:
-            with open(map_name, 'r') as f:
-                ax, ay = [int(val)
-                          for val in f.readline().strip().split(',')[:2]]
-                coin_distance = [[0]]
-                coins_sprites = pygame.sprite.Group()
-                coins = []
-                coin = Coin(ax, ay, 0)
-                coins_sprites.add(coin)
-                coins.append(coin)
-                ident = 1
-                while True:
-                    line = f.readline().strip()
-                    if not len(line):
-                        break
-                    values = [int(val) for val in line.split(',')]
-                    cx, cy = values[:2]
-                    coin = Coin(cx, cy, ident)
-                    coins_sprites.add(coin)
-                    coins.append(coin)
-                    ident += 1
-                    for iteration, coin_sublist in enumerate(coin_distance):
-                        coin_sublist.append(values[2 + iteration])
-                    coin_distance.append(
-                        values[2:2 + len(coin_distance)] + [0])
-                return (ax, ay), coin_distance, coins, coins_sprites
-        except Exception as e:
-            raise e
+        agent_pos, positions, coin_distance = mapfile.load_map(map_name)
+        coins_sprites = pygame.sprite.Group()
+        coins = []
+        for ident, (x, y) in enumerate(positions):
+            coin = Coin(x, y, ident)
+            coins_sprites.add(coin)
+            coins.append(coin)
+        return agent_pos, coin_distance, coins, coins_sprites
 
     def __init__(self):
         pygame.display.set_caption('Pytnik')
@@ -60,16 +42,26 @@ class Game:
             (config.WIDTH + config.SIDE_WIDTH, config.HEIGHT))
         self.surface_sprite = pygame.sprite.Group()
         self.surface_sprite.add(Surface())
-        agent_pos, self.coin_distance, self.coins, self.coins_sprites = Game.load_map(
-            sys.argv[1] if len(sys.argv) > 1 else os.path.join(config.MAP_FOLDER, input("Mapa: ") + '.txt'))
+        map_name = sys.argv[1] if len(sys.argv) > 1 else mapfile.find_map(config.MAP_FOLDER, input("Mapa: "))
+        agent_pos, self.coin_distance, self.coins, self.coins_sprites = Game.load_map(map_name)
         self.collected_coins = [CollectedCoin(coin) for coin in self.coins]
         self.collected_coins_sprites = pygame.sprite.Group()
         module = __import__('sprites')
         class_ = getattr(module, sys.argv[2] if len(
             sys.argv) > 2 else input("Agent: "))
-        self.agent = class_(agent_pos[0], agent_pos[1],
-                            f'{sys.argv[2]}.png' if len(sys.argv) > 2 else 'ExampleAgent.png')
+        agent_image = f'{sys.argv[2]}.png' if len(sys.argv) > 2 else 'ExampleAgent.png'
+        if not os.path.exists(os.path.join(config.IMG_FOLDER, agent_image)):
+            agent_image = 'ExampleAgent.png'
+        self.agent = class_(agent_pos[0], agent_pos[1], agent_image)
         self.max_elapsed_time = float(sys.argv[3]) if len(sys.argv) > 3 else 5000.
+        self.agent.time_budget = self.max_elapsed_time
+        if config.STATS:
+            self.agent.stats = SearchStats()
+        self.cache = SolutionCache() if config.CACHE else None
+        # profile - (report path prefix, profile kinds) for the solver, None when profiling is off
+        kinds = profile_kinds(config.PROFILE)
+        name = f'{os.path.splitext(os.path.basename(map_name))[0]}-{type(self.agent).__name__}'
+        self.profile = (os.path.join(config.PROFILE_FOLDER, name), kinds) if kinds else None
         self.elapsed_time = 0.
         self.agent_sprites = pygame.sprite.Group()
         self.agent_sprites.add(self.agent)
@@ -85,6 +77,14 @@ class Game:
         self.direction = 1
         self.time_out = False
         self.proper_path = True
+        # background - terrain with all coins, rebuilt on the next draw when None
+        # dirty - screen areas to redraw and push on the next draw
+        self.background = None
+        self.dirty = []
+        self.agent_rect = None
+        self.overlays = []
+        self.sidebar_state = None
+        self.text_cache = OrderedDict()
 
     def run(self):
         self.nodes = None
@@ -95,36 +95,30 @@ class Game:
         while self.running:
             try:
                 try:
-                    if self.nodes is None and not self.time_out:
+                    if self.nodes is None and not self.time_out and self.proper_path:
                         self.draw()
-                        tf_queue = Queue(1)
-                        tf = TimedFunction(threading.current_thread().ident, tf_queue,
-                                           self.max_elapsed_time, self.agent.get_agent_path, self.coin_distance)
-                        tf.daemon = True
-                        tf.start()
-                        start_time = time.time()
-                        sleep_time = 0.001
-                        while tf_queue.empty():
-                            time.sleep(sleep_time)
-                            self.elapsed_time = time.time() - start_time
-                            self.draw_time_meter()
-                            self.draw_calculating_text()
-                            self.events()
-                        self.nodes, elapsed = tf_queue.get(block=False)
-                        if not (min(self.nodes) == 0
-                                and max(self.nodes) == len(self.nodes) - 2 == len(set(self.nodes)) - 1
-                                and self.nodes[0] == self.nodes[-1] == 0):
+                        # a profiled run always solves, a replayed path would leave nothing to profile
+                        cached = self.cache.get(self.coin_distance, self.agent) \
+                            if self.cache is not None and self.agent.cacheable and self.profile is None else None
+                        if cached is not None:
+                            self.nodes = cached['path']
+                            self.check_path()
+                            if self.agent.stats is not None and cached['stats'] is not None:
+                                self.agent.stats = SearchStats.from_dict(cached['stats'])
                             print(
-                                f'ERR: Path {self.nodes} is not a permutation 0-N or does not start or end with 0!')
-                            self.proper_path = False
-                            raise EndGame()
-                        print(
-                            f'Algorithm time elapsed: {elapsed:.3f} seconds.')
+                                f'Cached path replayed, algorithm time elapsed: {cached["time"]:.3f} seconds.')
+                        else:
+                            self.solve()
                 except Timeout:
-                    print(
-                        f'ERR: Algorithm took more than {self.max_elapsed_time} seconds!')
                     self.time_out = True
-                    raise EndGame
+                    if self.agent.incumbent is None:
+                        print(
+                            f'ERR: Algorithm took more than {self.max_elapsed_time} seconds!')
+                        raise EndGame
+                    print(
+                        f'Algorithm took more than {self.max_elapsed_time} seconds, playing the best path found.')
+                    self.nodes = self.agent.incumbent
+                    self.check_path()
 
                 if self.playing:
                     if not self.agent.is_travelling() and journey_start and (not self.stepping or self.moving):
@@ -150,12 +144,14 @@ class Game:
                             self.coins_sprites.remove(coin)
                             self.collected_coins_sprites.add(
                                 self.collected_coins[to_id])
+                            self.redraw_coin(coin)
                         else:
                             del self.current_path[-1]
                             coin = self.coins[from_id]
                             self.coins_sprites.add(coin)
                             self.collected_coins_sprites.remove(
                                 self.collected_coins[from_id])
+                            self.redraw_coin(coin)
                         self.direction = 1
                         journey_start = True
                     self.clock.tick(config.FRAME_RATE)
@@ -172,16 +168,50 @@ class Game:
                         self.collected_coins_sprites.add(
                             self.collected_coins[ident])
                     self.agent.place_to(self.coins[0].position())
-                    self.current_path.clear()
-                    self.current_path_cost = 0
-                    for i in range(len(self.nodes) - 1):
-                        from_id, to_id = self.nodes[i], self.nodes[i + 1]
-                        self.current_path.append(
-                            (from_id, to_id, self.coin_distance[from_id][to_id]))
-                        self.current_path_cost += self.coin_distance[from_id][to_id]
+                    self.background = None
+                    costs = self.coin_distance.gather(self.nodes)
+                    self.current_path = list(zip(self.nodes, self.nodes[1:], costs))
+                    self.current_path_cost = sum(costs)
             except Exception as e:
                 raise e
 
+    def solve(self):
+        if self.cache is not None and self.agent.exact:
+            self.agent.upper_bound = self.cache.upper_bound(self.coin_distance)
+        solver = SolverProcess(self.max_elapsed_time, self.agent, self.coin_distance, profile=self.profile)
+        try:
+            solver.start()
+            while not solver.wait(1 / config.FRAME_RATE):
+                self.elapsed_time = time.time() - solver.start_time
+                self.draw_time_meter()
+                self.draw_calculating_text()
+                self.events()
+        finally:
+            solver.close()
+            self.background = None
+        if solver.error is not None:
+            print(f'ERR: Algorithm failed!\n{solver.error}')
+            self.proper_path = False
+            raise EndGame()
+        self.nodes, elapsed = solver.result
+        self.check_path()
+        print(
+            f'Algorithm time elapsed: {elapsed:.3f} seconds.')
+        if self.agent.stats is not None:
+            print(json.dumps({'agent': type(self.agent).__name__, 'time': round(elapsed, 6),
+                              'peak_memory_kb': solver.peak_memory, **self.agent.stats.as_dict()}))
+        if self.cache is not None and self.agent.cacheable:
+            self.cache.put(self.coin_distance, self.agent, self.nodes, elapsed)
+
+    def check_path(self):
+        if not (min(self.nodes) == 0
+                and max(self.nodes) == len(self.nodes) - 2 == len(set(self.nodes)) - 1
+                and self.nodes[0] == self.nodes[-1] == 0):
+            print(
+                f'ERR: Path {self.nodes} is not a permutation 0-N or does not start or end with 0!')
+            self.proper_path = False
+            raise EndGame()
+
     def draw_time_meter(self):
         x, y, w, h, m = 20, 20, 120, 30, 3
         color = config.BLACK
@@ -196,30 +226,57 @@ class Game:
         text = config.INFO_FONT.render(text, True, config.WHITE)
         self.screen.blit(text, (x + w // 2 + m // 2 - text_width //
                                 2, y + h // 2 - m // 2 - text_height // 2))
-        pygame.display.flip()
+        pygame.display.update((x, y, w, h))
+
+    # text surfaces are rendered once, the cache keeps the most recently used ones
+    def render(self, font, text, color):
+        key = id(font), text, color
+        if key in self.text_cache:
+            self.text_cache.move_to_end(key)
+        else:
+            self.text_cache[key] = font.render(text, True, color)
+            if len(self.text_cache) > 256:
+                self.text_cache.popitem(last=False)
+        return self.text_cache[key]
 
+    # the sidebar is only redrawn when the path, its cost or the stats change
+    # return value - whether anything was drawn
     def draw_path(self):
+        stats = [] if self.nodes is None or self.agent.stats is None else self.agent.stats.lines()
+        state = len(self.current_path), self.current_path_cost, tuple(stats)
+        if state == self.sidebar_state:
+            return False
+        self.sidebar_state = state
+
         self.screen.fill(config.BLACK, rect=(
             config.WIDTH, 0, config.SIDE_WIDTH, config.HEIGHT))
         text = f'======= Steps ======='
         _, text_height = config.INFO_FONT.size(text)
         left = config.WIDTH + 10
-        text = config.INFO_FONT.render(text, True, config.GREEN)
+        text = self.render(config.INFO_FONT, text, config.GREEN)
         self.screen.blit(text, (left + 5, 10))
-        s_ind = 0 if len(self.current_path) < 20 else len(
-            self.current_path) - 20
+        # search counters take the place of the oldest steps
+        shown = 20 - len(stats) - 1 if stats else 20
+        s_ind = 0 if len(self.current_path) < shown else len(
+            self.current_path) - shown
         for i, part in enumerate(self.current_path[s_ind:]):
-            text = config.INFO_FONT.render(f'{(i + s_ind + 1):2} | '
-                                           f'{part[0]:3} - {part[1]:3} : ', True, config.GREEN)
+            text = self.render(config.INFO_FONT, f'{(i + s_ind + 1):2} | '
+                                                 f'{part[0]:3} - {part[1]:3} : ', config.GREEN)
             top = int(5 + text_height * 1.5 * (i + 1))
             self.screen.blit(text, (left, top))
-            text = config.INFO_FONT.render(f'{part[2]:3}', True, config.WHITE)
+            text = self.render(config.INFO_FONT, f'{part[2]:3}', config.WHITE)
             self.screen.blit(text, (left + 180, top))
-        text = config.INFO_FONT.render('=' * 22, True, config.GREEN)
+        for i, (name, value) in enumerate(stats):
+            top = config.HEIGHT - 50 - int(text_height * 1.5 * (len(stats) - i))
+            text = self.render(config.INFO_FONT, f'{name[:15]:15}', config.GREEN)
+            self.screen.blit(text, (left, top))
+            text = self.render(config.INFO_FONT, value, config.WHITE)
+            self.screen.blit(text, (left + 215 - text.get_width(), top))
+        text = self.render(config.INFO_FONT, '=' * 22, config.GREEN)
         self.screen.blit(text, (left, config.HEIGHT - 50))
-        text = config.INFO_FONT.render(
-            f'Cost: {self.current_path_cost}', True, config.GREEN)
+        text = self.render(config.INFO_FONT, f'Cost: {self.current_path_cost}', config.GREEN)
         self.screen.blit(text, (left, config.HEIGHT - 30))
+        return True
 
     def draw_calculating_text(self):
         if 'subsurface' not in Game.draw_calculating_text.__dict__:
@@ -236,41 +293,88 @@ class Game:
         self.screen.blit(Game.draw_calculating_text.subsurface,
                          Game.draw_calculating_text.rect)
         self.screen.blit(text, Game.draw_calculating_text.rect[:2])
+        pygame.display.update(Game.draw_calculating_text.rect)
 
-    def draw_info_text(self):
+    def info_text(self):
         text = 'TIMED OUT' if self.time_out \
             else '' if self.nodes is None \
             else 'GAME OVER' if self.game_over \
             else 'PAUSED'
-        if len(text):
-            text_width, text_height = config.GAME_FONT.size(text)
-            text = config.GAME_FONT.render(text, True, config.RED)
-            self.screen.blit(text, (config.WIDTH // 2 - text_width //
-                                    2, config.HEIGHT // 2 - text_height // 2))
+        if not len(text):
+            return None
+        text = self.render(config.GAME_FONT, text, config.RED)
+        return text, text.get_rect(center=(config.WIDTH // 2, config.HEIGHT // 2))
+
+    def step_text(self):
+        text = self.render(config.GAME_FONT, f'STEP {len(self.current_path)}/{len(self.nodes) - 1}', config.WHITE)
+        return text, text.get_rect(midtop=(config.WIDTH // 2, 10))
 
-    def draw_step_text(self):
-        text = f'STEP {len(self.current_path)}/{len(self.nodes) - 1}'
-        text_width, _ = config.GAME_FONT.size(text)
-        text = config.GAME_FONT.render(text, True, config.WHITE)
-        self.screen.blit(text, (config.WIDTH // 2 - text_width // 2, 10))
+    # terrain with every coin in its current state, the agent and texts are drawn over it
+    def draw_background(self):
+        self.background = pygame.Surface((config.WIDTH, config.HEIGHT)).convert()
+        for group in (self.surface_sprite, self.coins_sprites, self.collected_coins_sprites):
+            group.draw(self.background)
+            for sprite in group:
+                if hasattr(sprite, 'draw'):
+                    sprite.draw(self.background)
 
+    # repaints the background under a coin that was collected or given back,
+    # overlapping coins are drawn in the same order as in draw_background
+    def redraw_coin(self, coin):
+        if self.background is None:
+            return
+        self.background.set_clip(coin.rect)
+        self.background.blit(self.surface_sprite.sprites()[0].image, coin.rect, coin.rect)
+        for group in (self.coins_sprites, self.collected_coins_sprites):
+            overlapping = [sprite for sprite in group if sprite.rect.colliderect(coin.rect)]
+            for sprite in overlapping:
+                self.background.blit(sprite.image, sprite.rect)
+            for sprite in overlapping:
+                sprite.draw(self.background)
+        self.background.set_clip(None)
+        self.dirty.append(coin.rect.copy())
+
+    # only areas the agent moved across, changed coins and changed texts are redrawn and pushed to the display
     def draw(self):
-        self.surface_sprite.draw(self.screen)
-        self.coins_sprites.draw(self.screen)
-        for coin in self.coins_sprites:
-            if hasattr(coin, 'draw'):
-                coin.draw(self.screen)
-        self.collected_coins_sprites.draw(self.screen)
-        for coin in self.collected_coins_sprites:
-            if hasattr(coin, 'draw'):
-                coin.draw(self.screen)
-        self.agent_sprites.draw(self.screen)
-        self.draw_path()
+        full = self.background is None
+        if full:
+            self.draw_background()
+            self.dirty = [pygame.Rect(0, 0, config.WIDTH, config.HEIGHT)]
+            self.sidebar_state = None
+
+        dirty, self.dirty = self.dirty, []
+        agent_rect = self.agent.rect.copy()
+        if agent_rect != self.agent_rect:
+            dirty += [agent_rect] if self.agent_rect is None else [self.agent_rect, agent_rect]
+            self.agent_rect = agent_rect
+
+        overlays = []
         if not self.playing:
-            self.draw_info_text()
+            overlays.append(self.info_text())
         if self.stepping:
-            self.draw_step_text()
-        pygame.display.flip()
+            overlays.append(self.step_text())
+        overlays = [overlay for overlay in overlays if overlay is not None]
+        if overlays != self.overlays:
+            dirty += [rect for _, rect in self.overlays + overlays]
+            self.overlays = overlays
+
+        # the sidebar covers whatever reaches over the map's edge
+        self.screen.set_clip((0, 0, config.WIDTH, config.HEIGHT))
+        for rect in dirty:
+            self.screen.blit(self.background, rect, rect)
+        if agent_rect.collidelist(dirty) != -1:
+            self.agent_sprites.draw(self.screen)
+        for text, rect in overlays:
+            if rect.collidelist(dirty) != -1:
+                self.screen.blit(text, rect)
+        self.screen.set_clip(None)
+
+        if self.draw_path():
+            dirty.append(pygame.Rect(config.WIDTH, 0, config.SIDE_WIDTH, config.HEIGHT))
+        if full:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
 
     def events(self):
         # catch all events here
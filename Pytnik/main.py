@@ -1,15 +1,26 @@
+import sys
 import traceback
-import pygame
 
-from game import Game
+import config
 
-try:
-    pygame.init()
-    g = Game()
-    g.run()
-except (Exception,):
-    traceback.print_exc()
-    input()
-finally:
-    pygame.display.quit()
-    pygame.quit()
+if __name__ == '__main__':
+    # pygame and the game are only imported here, spawned solver processes import this module as __mp_main__
+    # and must not load them
+    import pygame
+    from game import Game
+
+    # --profile or --profile=cpu|memory|cpu,memory can come anywhere among the map, agent and time arguments
+    for arg in sys.argv[1:]:
+        if arg == '--profile' or arg.startswith('--profile='):
+            config.PROFILE = arg.partition('=')[2] or 'cpu,memory'
+            sys.argv.remove(arg)
+    try:
+        pygame.init()
+        g = Game()
+        g.run()
+    except (Exception,):
+        traceback.print_exc()
+        input()
+    finally:
+        pygame.display.quit()
+        pygame.quit()
@@ -0,0 +1,130 @@
+import itertools
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from matrix import CostMatrix
+from points import PointMatrix
+
+# text map - the first line holds the agent position (coin 0 lies under the agent),
+# every following line a coin position and the distances from that coin to all previous coins
+# binary map - header (magic, version, coins), then coins x 2 coordinates and coins x coins distances, all int32
+BINARY_EXTENSION = '.bin'
+BINARY_MAGIC = b'PTNK'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sII')
+# coordinate map - the first line names the metric (see points.METRICS), every following line holds a coin
+# position, the first one is the agent position (coin 0 lies under the agent), distances are computed when used
+POINTS_EXTENSION = '.pts'
+
+
+def read_map(map_name):
+    with open(map_name, 'r') as f:
+        ax, ay = [int(val) for val in f.readline().strip().split(',')[:2]]
+        positions = [(ax, ay)]
+        rows = []
+        while True:
+            line = f.readline().strip()
+            if not len(line):
+                break
+            values = [int(val) for val in line.split(',')]
+            positions.append((values[0], values[1]))
+            rows.append(values[2:2 + len(rows) + 1])
+
+    size = len(positions)
+    values = array('i', bytes(4 * size * size))
+    for ident, row in enumerate(rows, 1):
+        row = array('i', row)
+        values[ident * size:ident * size + ident] = row
+        values[ident:ident * size:size] = row
+    return (ax, ay), positions, CostMatrix.from_buffer(values, size)
+
+
+# coin_distance - rows of a symmetric cost matrix, only the part below the diagonal is written
+def write_map(map_name, positions, coin_distance):
+    with open(map_name, 'w') as f:
+        for ident, (row, position) in enumerate(zip(coin_distance, positions)):
+            f.write(', '.join(str(val) for val in list(position) + list(row[:ident])) + '\n')
+
+
+# the distances are mapped from the file, the cost matrix is a view into it
+def read_binary_map(map_name):
+    with open(map_name, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, size = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f'{map_name} is not a version {BINARY_VERSION} binary map')
+
+    values = memoryview(data)[BINARY_HEADER.size:BINARY_HEADER.size + 4 * (2 + size) * size]
+    if sys.byteorder != 'little':
+        values = array('i', bytes(values))
+        values.byteswap()
+    values = memoryview(values).cast('i')
+
+    positions = [(values[2 * i], values[2 * i + 1]) for i in range(size)]
+    return positions[0], positions, CostMatrix.from_buffer(values[2 * size:], size)
+
+
+# coin_distance - rows of the cost matrix, may be a generator so large maps never have to be held in memory
+def write_binary_map(map_name, positions, coin_distance):
+    with open(map_name, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(positions)))
+        for row in itertools.chain([itertools.chain.from_iterable(positions)], coin_distance):
+            row = array('i', row)
+            if sys.byteorder != 'little':
+                row.byteswap()
+            f.write(row.tobytes())
+
+
+def read_points_map(map_name):
+    with open(map_name, 'r') as f:
+        metric = f.readline().strip()
+        positions = [tuple(int(val) for val in line.split(',')[:2]) for line in f if line.strip()]
+    return positions[0], positions, PointMatrix(positions, metric)
+
+
+def write_points_map(map_name, positions, metric='euclidean'):
+    with open(map_name, 'w') as f:
+        f.write(metric + '\n')
+        for x, y in positions:
+            f.write(f'{x}, {y}\n')
+
+
+def load_map(map_name):
+    if map_name.endswith(BINARY_EXTENSION):
+        return read_binary_map(map_name)
+    if map_name.endswith(POINTS_EXTENSION):
+        return read_points_map(map_name)
+    return read_map(map_name)
+
+
+# name - map name without extension, text maps are preferred over coordinate and binary ones
+def find_map(folder, name):
+    for extension in ('.txt', POINTS_EXTENSION):
+        if os.path.exists(os.path.join(folder, name + extension)):
+            return os.path.join(folder, name + extension)
+    return os.path.join(folder, name + BINARY_EXTENSION)
+
+
+# only coordinate maps can be written as coordinate maps, the distances of the others need not follow any metric
+def convert_map(source, destination):
+    _, positions, coin_distance = load_map(source)
+    if destination.endswith(POINTS_EXTENSION):
+        if not isinstance(coin_distance, PointMatrix):
+            raise ValueError(f'{source} is not a coordinate map')
+        write_points_map(destination, positions, coin_distance.metric)
+    elif destination.endswith(BINARY_EXTENSION):
+        write_binary_map(destination, positions, coin_distance)
+    else:
+        write_map(destination, positions, coin_distance)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(f'Usage: {sys.argv[0]} SOURCE DESTINATION (maps ending with {BINARY_EXTENSION} are binary, '
+              f'with {POINTS_EXTENSION} coordinate maps)')
+        sys.exit(1)
+    convert_map(sys.argv[1], sys.argv[2])
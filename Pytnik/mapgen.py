@@ -0,0 +1,84 @@
+import argparse
+import math
+import random
+
+import config
+from mapfile import BINARY_EXTENSION, POINTS_EXTENSION, write_binary_map, write_map, write_points_map
+from points import METRICS
+
+KINDS = ('euclidean', 'clustered', 'nonmetric')
+
+
+def random_positions(rnd, coins):
+    return [(rnd.randint(0, config.WIDTH - config.SPRITE_SIZE), rnd.randint(0, config.HEIGHT - config.SPRITE_SIZE))
+            for _ in range(coins)]
+
+
+def clustered_positions(rnd, coins, clusters):
+    centers = random_positions(rnd, clusters)
+    spread = min(config.WIDTH, config.HEIGHT) / (4 * math.sqrt(clusters))
+    positions = []
+    for ident in range(coins):
+        cx, cy = centers[ident % clusters]
+        positions.append((min(max(round(rnd.gauss(cx, spread)), 0), config.WIDTH - config.SPRITE_SIZE),
+                          min(max(round(rnd.gauss(cy, spread)), 0), config.HEIGHT - config.SPRITE_SIZE)))
+    return positions
+
+
+# rows are produced one at a time, so even large maps are written without building the whole matrix
+def euclidean_distances(positions):
+    for x, y in positions:
+        yield [round(math.hypot(x - px, y - py)) for px, py in positions]
+
+
+# symmetric random distances that ignore the coin positions, like the bundled maps
+def random_distances(rnd, coins, max_distance):
+    rows = []
+    for ident in range(coins):
+        row = [rows[other][ident] for other in range(ident)] + [0]
+        row += [rnd.randint(1, max_distance) for _ in range(ident + 1, coins)]
+        rows.append(row)
+    return rows
+
+
+# coins - number of coins including coin 0 under the agent
+def generate_map(kind, coins, seed=None, clusters=8, max_distance=500):
+    rnd = random.Random(seed)
+    if kind == 'clustered':
+        positions = clustered_positions(rnd, coins, clusters)
+    else:
+        positions = random_positions(rnd, coins)
+
+    if kind == 'nonmetric':
+        return positions, random_distances(rnd, coins, max_distance)
+    return positions, euclidean_distances(positions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates random Pytnik maps.')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('coins', type=int, help='number of coins including the one under the agent')
+    parser.add_argument('output', help=f'map file, written in the binary format if it ends with {BINARY_EXTENSION}, '
+                                       f'as coordinates only with {POINTS_EXTENSION}')
+    parser.add_argument('-s', '--seed', type=int)
+    parser.add_argument('-c', '--clusters', type=int, default=8)
+    parser.add_argument('-d', '--max-distance', type=int, default=500, help='largest distance of nonmetric maps')
+    parser.add_argument('-m', '--metric', choices=list(METRICS), default='euclidean', help='metric of coordinate maps')
+    args = parser.parse_args()
+
+    if args.output.endswith(POINTS_EXTENSION):
+        if args.kind == 'nonmetric':
+            parser.error('nonmetric maps can not be written as coordinate maps')
+        positions, _ = generate_map(args.kind, args.coins, args.seed, args.clusters, args.max_distance)
+        write_points_map(args.output, positions, args.metric)
+        return
+
+    positions, coin_distance = generate_map(args.kind, args.coins, args.seed, args.clusters, args.max_distance)
+    if args.output.endswith(BINARY_EXTENSION):
+        write_binary_map(args.output, positions, coin_distance)
+    else:
+        write_map(args.output, positions, coin_distance)
+
+
+if __name__ == '__main__':
+    main()
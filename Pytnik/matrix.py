@@ -0,0 +1,62 @@
+import hashlib
+import itertools
+from array import array
+from operator import getitem
+
+from points import PointMatrix
+
+
+# immutable cost matrix kept in one contiguous int32 buffer, rows are read only views into it,
+# so matrix[i][j] works the same as with a list of lists
+class CostMatrix(tuple):
+    # rows - any rows of ints (lists, arrays, views)
+    def __new__(cls, rows):
+        rows = list(rows)
+        return cls.from_buffer(array('i', itertools.chain.from_iterable(rows)), len(rows))
+
+    # buffer - anything exporting at least size * size native int32 values (array, mmap, shared memory)
+    @classmethod
+    def from_buffer(cls, buffer, size):
+        values = memoryview(buffer).cast('B')[:4 * size * size].cast('i').toreadonly()
+        matrix = tuple.__new__(cls, (values[i * size:(i + 1) * size] for i in range(size)))
+        matrix.values = values
+        return matrix
+
+    @classmethod
+    def from_bytes(cls, data, size):
+        return cls.from_buffer(array('i', data), size)
+
+    def __reduce__(self):
+        return CostMatrix.from_bytes, (self.values.tobytes(), len(self))
+
+    def row(self, i):
+        return self[i]
+
+    # costs of consecutive steps of path
+    def gather(self, path):
+        return array('i', map(getitem, map(self.__getitem__, path[:-1]), path[1:]))
+
+    def path_cost(self, path):
+        return sum(self.gather(path))
+
+    def nbytes(self):
+        return self.values.nbytes
+
+    def digest(self):
+        return hashlib.sha256(self.values).hexdigest()
+
+    # lets go of the underlying buffer even while rows are still referenced, they cannot be read afterwards
+    def release(self):
+        for row in self:
+            row.release()
+        self.values.release()
+
+
+# coin_distance as a matrix with gather, path_cost and digest, coordinate maps keep computing their rows lazily
+def cost_matrix(coin_distance):
+    return coin_distance if isinstance(coin_distance, (CostMatrix, PointMatrix)) else CostMatrix(coin_distance)
+
+
+# coin_distance as one contiguous int32 buffer, coordinate maps are computed in full
+def dense_matrix(coin_distance):
+    return coin_distance if isinstance(coin_distance, CostMatrix) else CostMatrix(coin_distance)
@@ -0,0 +1,207 @@
+import hashlib
+import heapq
+import itertools
+import math
+from array import array
+from collections import OrderedDict
+from operator import sub
+
+# distance between two coins from the differences of their coordinates, always an int like in matrix maps
+# euclidean - rounded to the nearest int (as mapgen writes them), ceil - rounded up, so the triangle inequality holds
+METRICS = {
+    'euclidean': lambda dx, dy: round(math.hypot(dx, dy)),
+    'manhattan': lambda dx, dy: abs(dx) + abs(dy),
+    'ceil': lambda dx, dy: math.ceil(math.hypot(dx, dy)),
+}
+
+
+# cost matrix of a coordinate map, matrix[i][j] computes just that distance, a whole row is only computed when it
+# is iterated and only the most recently used cache_rows of those are kept, so maps with many coins never need
+# the whole matrix
+# works like CostMatrix: matrix[i][j], len, iteration over rows, gather and path_cost
+class PointMatrix:
+    def __init__(self, positions, metric='euclidean', cache_rows=256):
+        if metric not in METRICS:
+            raise ValueError(f'Unknown metric {metric!r}, expected one of {", ".join(METRICS)}')
+        self.xs = array('i', (x for x, _ in positions))
+        self.ys = array('i', (y for _, y in positions))
+        self.metric = metric
+        self.function = METRICS[metric]
+        self.cache_rows = cache_rows
+        self.rows = OrderedDict()
+
+    def __len__(self):
+        return len(self.xs)
+
+    # return value - the cached row if there is one, otherwise a row that computes its entries when read
+    def __getitem__(self, i):
+        row = self.rows.get(i)
+        if row is not None:
+            self.rows.move_to_end(i)
+            return row
+        return PointRow(self, i)
+
+    def full_row(self, i):
+        row = self.rows.get(i)
+        if row is not None:
+            self.rows.move_to_end(i)
+            return row
+
+        row = self.compute_row(i)
+        self.rows[i] = row
+        if len(self.rows) > self.cache_rows:
+            self.rows.popitem(last=False)
+        return row
+
+    # rows are computed one at a time and not cached, a full pass would only evict the useful ones
+    def __iter__(self):
+        return map(self.compute_row, range(len(self)))
+
+    def __reduce__(self):
+        return PointMatrix, (self.positions(), self.metric, self.cache_rows)
+
+    def compute_row(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('coin index out of range')
+        x, y = self.xs[i], self.ys[i]
+        return array('i', map(self.function, map(sub, itertools.repeat(x), self.xs),
+                              map(sub, itertools.repeat(y), self.ys)))
+
+    def positions(self):
+        return list(zip(self.xs, self.ys))
+
+    def distance(self, i, j):
+        return self.function(self.xs[i] - self.xs[j], self.ys[i] - self.ys[j])
+
+    def row(self, i):
+        return self[i]
+
+    # costs of consecutive steps of path, without computing any row
+    def gather(self, path):
+        return array('i', map(self.distance, path[:-1], path[1:]))
+
+    def path_cost(self, path):
+        return sum(self.gather(path))
+
+    def nbytes(self):
+        return sum(row.itemsize * len(row) for row in self.rows.values())
+
+    def digest(self):
+        return hashlib.sha256(self.metric.encode() + self.xs.tobytes() + self.ys.tobytes()).hexdigest()
+
+    def release(self):
+        self.rows.clear()
+
+    # coins - coins the index starts with
+    def grid(self, coins):
+        return GridIndex(self, coins)
+
+
+# row i of a PointMatrix, reading an entry computes only that distance, iterating or slicing it computes the row
+class PointRow:
+    __slots__ = ('matrix', 'i')
+
+    def __init__(self, matrix, i):
+        self.matrix = matrix
+        self.i = i
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return self.matrix.full_row(self.i)[j]
+        return self.matrix.distance(self.i, j)
+
+    def __iter__(self):
+        return iter(self.matrix.full_row(self.i))
+
+
+# coins of a coordinate map bucketed by a square grid, nearest coins are found by looking at the cells in rings
+# around a coin instead of at every coin
+# the grid is rebuilt with larger cells once most of its coins are removed, so rings do not cross many empty cells
+class GridIndex:
+    # coins per cell on average
+    density = 2
+
+    def __init__(self, matrix, coins):
+        self.matrix = matrix
+        self.build(list(coins))
+
+    def build(self, coins):
+        xs, ys = self.matrix.xs, self.matrix.ys
+        self.size = self.built = len(coins)
+        self.cells = dict()
+        if not coins:
+            return
+
+        left, right = min(xs[coin] for coin in coins), max(xs[coin] for coin in coins)
+        top, bottom = min(ys[coin] for coin in coins), max(ys[coin] for coin in coins)
+        self.cell = max(1, math.isqrt((right - left + 1) * (bottom - top + 1) * self.density // len(coins)))
+        self.bounds = left // self.cell, right // self.cell, top // self.cell, bottom // self.cell
+        for coin in coins:
+            self.cells.setdefault((xs[coin] // self.cell, ys[coin] // self.cell), []).append(coin)
+
+    def __len__(self):
+        return self.size
+
+    def remove(self, coin):
+        key = self.matrix.xs[coin] // self.cell, self.matrix.ys[coin] // self.cell
+        cell = self.cells[key]
+        cell.remove(coin)
+        if not cell:
+            del self.cells[key]
+        self.size -= 1
+        if self.size and 4 * self.size < self.built:
+            self.build([coin for cell in self.cells.values() for coin in cell])
+
+    # coin - any coin of the map, it does not have to be in the index
+    # return value - (distance, coin) of the nearest coin in the index, the lowest coin of equally near ones,
+    # None if the index is empty
+    def nearest(self, coin):
+        if not self.size:
+            return None
+
+        distance = self.matrix.distance
+        best = None
+        for bound, coins in self.rings(coin):
+            if best is not None and bound > best[0]:
+                break
+            for other in coins:
+                candidate = distance(coin, other), other
+                if best is None or candidate < best:
+                    best = candidate
+        return best
+
+    # return value - the k coins of the index nearest to coin (coin itself left out), nearest and then lowest first
+    def neighbours(self, coin, k):
+        distance = self.matrix.distance
+        # found - (-distance, -coin) of the k best coins so far, the worst one on top
+        found = []
+        for bound, coins in self.rings(coin):
+            if len(found) == k and bound > -found[0][0]:
+                break
+            for other in coins:
+                if other == coin:
+                    continue
+                candidate = -distance(coin, other), -other
+                if len(found) < k:
+                    heapq.heappush(found, candidate)
+                elif candidate > found[0]:
+                    heapq.heapreplace(found, candidate)
+        return [-other for _, other in sorted(found, reverse=True)]
+
+    # cells in rings around the cell of coin, nearest ring first
+    # return value - (lowest possible distance, coins) of every ring, coins in ring r are more than (r - 1) * cell
+    # away along x or y, which bounds them under every metric
+    def rings(self, coin):
+        if not self.size:
+            return
+        cx, cy = self.matrix.xs[coin] // self.cell, self.matrix.ys[coin] // self.cell
+        left, right, top, bottom = self.bounds
+        for r in range(max(cx - left, right - cx, cy - top, bottom - cy) + 1):
+            coins = []
+            for dx in range(-r, r + 1):
+                for dy in (range(-r, r + 1) if abs(dx) == r else (-r, r) if r else (0,)):
+                    coins.extend(self.cells.get((cx + dx, cy + dy), ()))
+            yield max(0, (r - 1) * self.cell + 1), coins
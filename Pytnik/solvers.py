@@ -0,0 +1,1092 @@
+import bisect
+import contextlib
+import heapq
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
+
+from matrix import cost_matrix, dense_matrix
+from points import PointMatrix
+
+
+# search part of an agent, kept free of pygame so solver processes and scripts can import it quickly,
+# the agent sprites in sprites.py combine a solver with its sprite
+class Solver:
+    # seconds the game allows for get_agent_path, None if unlimited
+    time_budget = None
+    # part of time_budget anytime agents may use before returning their best tour
+    budget_fraction = 0.9
+    # best path published so far, the game plays it if get_agent_path runs out of time
+    incumbent = None
+    # util.SearchStats filled by get_agent_path, None when instrumentation is disabled
+    stats = None
+    # cost of a known tour, exact agents skip anything more expensive
+    upper_bound = None
+    # exact - returned tours are optimal, cacheable - tours may be stored and replayed (not for agents whose
+    # tours depend on time_budget, a cached tour would be replayed under any budget), version - bumped when
+    # the tours an agent returns change, so older cached tours are not replayed
+    exact = False
+    cacheable = True
+    version = 1
+    # most local search moves update_agent_path makes per changed coin
+    repair_limit = 16
+
+    def get_deadline(self):
+        return time.time() + self.time_budget * self.budget_fraction if self.time_budget else math.inf
+
+    # anytime agents call this with every path that improves on the previous one
+    def publish(self, path):
+        self.incumbent = list(path)
+
+    # times the enclosed part of the search, does nothing when stats are disabled
+    def phase(self, name):
+        return contextlib.nullcontext() if self.stats is None else self.stats.phase(name)
+
+    # coin_distance - cost matrix
+    # return value - list of coin identifiers (containing 0 as first and last element, as well)
+    def get_agent_path(self, coin_distance):
+        pass
+
+    # tour of a map that differs from an already solved one by a few coins, the old tour is repaired instead of
+    # searching again: removed coins are spliced out, new coins go where they cost the least and the tour is
+    # improved around every change, exact agents then search with the cost of the repaired tour as upper bound
+    # coin_distance - cost matrix of the changed map, path - tour of the old map
+    # removed - identifiers of old coins that are gone, the rest keep their order (0 stays 0) and take the first
+    # identifiers of the new map, the new coins come after them
+    def update_agent_path(self, coin_distance, path, removed=()):
+        removed = set(removed)
+        if 0 in removed:
+            raise ValueError('Coin 0 can not be removed')
+        kept = [coin for coin in sorted(set(path)) if coin not in removed]
+        if len(kept) > len(coin_distance):
+            raise ValueError('The path has more coins than the map')
+        identifier = {coin: i for i, coin in enumerate(kept)}
+
+        with self.phase('repair'):
+            # coins joined by an edge the old tour did not have are checked first
+            successor = dict(zip(path, path[1:]))
+            tour = [identifier[coin] for coin in path[:-1] if coin not in removed]
+            touched = set()
+            for coin, after in zip(tour, tour[1:] + tour[:1]):
+                if successor[kept[coin]] != kept[after]:
+                    touched.update((coin, after))
+
+            for coin in range(len(kept), len(coin_distance)):
+                row = coin_distance[coin]
+                best, position = math.inf, 0
+                for i in range(len(tour)):
+                    x, y = tour[i], tour[(i + 1) % len(tour)]
+                    if coin_distance[x][coin] + row[y] - coin_distance[x][y] < best:
+                        best, position = coin_distance[x][coin] + row[y] - coin_distance[x][y], i + 1
+                tour.insert(position, coin)
+                touched.add(coin)
+
+            moves = repair(coin_distance, tour, sorted(touched), self.get_deadline(),
+                           self.repair_limit * (len(removed) + len(coin_distance) - len(kept)))
+
+        if self.stats is not None:
+            self.stats.count('inserted', len(coin_distance) - len(kept))
+            self.stats.count('repair_moves', moves)
+
+        result = tour + [0]
+        self.publish(result)
+        if not self.exact:
+            return result
+
+        # the bound only holds for this map, so the caller's one is restored afterwards
+        previous = self.upper_bound
+        self.upper_bound = cost_matrix(coin_distance).path_cost(result)
+        try:
+            return self.get_agent_path(coin_distance)
+        finally:
+            self.upper_bound = previous
+
+
+class ExampleAgent(Solver):
+    cacheable = False
+
+    def get_agent_path(self, coin_distance):
+        path = [i for i in range(1, len(coin_distance))]
+        random.shuffle(path)
+        return [0] + path + [0]
+
+
+class Aki(Solver):
+    def get_agent_path(self, coin_distance):
+        # coordinate maps find the nearest coin with a grid, without computing any whole row
+        if isinstance(coin_distance, PointMatrix):
+            grid = coin_distance.grid(range(1, len(coin_distance)))
+            path = [0]
+            while len(grid):
+                _, current = grid.nearest(path[-1])
+                grid.remove(current)
+                path.append(current)
+            return path + [0]
+
+        unvisited = [i for i in range(1, len(coin_distance))]
+
+        path = list()
+
+        current = 0
+        while unvisited:
+            index = min(unvisited, key=coin_distance[current].__getitem__)
+
+            current = index
+            unvisited.remove(index)
+            path.append(index)
+
+        return [0] + path + [0]
+
+
+# state of a Jocke worker process, set once by jocke_init
+jocke_state = dict()
+
+
+def jocke_init(coin_distance, best):
+    jocke_state['coin_distance'] = coin_distance
+    jocke_state['best'] = best
+
+
+def jocke_task(prefix):
+    return jocke_search(jocke_state['coin_distance'], prefix, jocke_state['best'])
+
+
+# best - cost shared between workers, tours more expensive than it are pruned
+# publish - called with every improving path
+# bound - tours more expensive than it are pruned when there is no shared cost
+# return value - cost of the cheapest tour starting with prefix (first one in permutation order),
+# the tour and the number of expanded nodes
+def jocke_search(coin_distance, prefix, best=None, publish=None, bound=math.inf):
+    # tours are extended depth first in permutation order, reusing the cost of the shared prefix
+    # cheapest - cheapest edge entering each coin, every remaining coin and the return to 0 need one
+    cheapest = [min((row[j] for i, row in enumerate(coin_distance) if i != j), default=0)
+                for j in range(len(coin_distance))]
+    rest = [i for i in range(1, len(coin_distance)) if i not in prefix]
+    taken = [False] * len(coin_distance)
+    route = list(prefix)
+
+    minimal = math.inf
+    bound = best.value if best is not None else bound
+    path = None
+    expanded = 0
+
+    def extend(current, cost, depth, lower):
+        nonlocal minimal, bound, path, expanded
+
+        expanded += 1
+        if best is not None and not expanded % 4096:
+            bound = best.value
+
+        if depth == len(rest):
+            cost += coin_distance[current][0]
+            if cost < minimal and cost <= bound:
+                path = route + [0]
+                minimal = cost
+
+                if publish is not None:
+                    publish([0] + path)
+                if best is not None:
+                    with best.get_lock():
+                        best.value = min(best.value, cost)
+            return
+
+        row = coin_distance[current]
+        for node in rest:
+            if taken[node]:
+                continue
+
+            estimate = cost + row[node] + lower - cheapest[node]
+            if estimate >= minimal or estimate > bound:
+                continue
+
+            taken[node] = True
+            route.append(node)
+            extend(node, cost + row[node], depth + 1, lower - cheapest[node])
+            route.pop()
+            taken[node] = False
+
+    current = 0
+    cost = 0
+    for node in prefix:
+        cost += coin_distance[current][node]
+        current = node
+
+    extend(current, cost, 0, cheapest[0] + sum(cheapest[i] for i in rest))
+
+    return minimal, path, expanded
+
+
+class Jocke(Solver):
+    exact = True
+    parallel_threshold = 9
+    workers = os.cpu_count()
+
+    def get_agent_path(self, coin_distance):
+        coins = len(coin_distance) - 1
+        bound = math.inf if self.upper_bound is None else self.upper_bound
+        if coins < self.parallel_threshold:
+            with self.phase('search'):
+                _, path, expanded = jocke_search(coin_distance, (), publish=self.publish, bound=bound)
+            if self.stats is not None:
+                self.stats.count('expanded', expanded)
+            return [0] + path
+
+        # prefixes are handed out in permutation order, so the first cheapest result matches the serial search
+        # imported here, so importing the solvers stays cheap
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        prefixes = list(itertools.permutations(range(1, coins + 1), 2 if 1 < coins < 2 * self.workers else 1))
+        best = multiprocessing.Value('d', bound)
+
+        minimal = math.inf
+        with self.phase('search'), \
+                ProcessPoolExecutor(self.workers, initializer=jocke_init, initargs=(coin_distance, best)) as executor:
+            for cost, path, expanded in executor.map(jocke_task, prefixes):
+                if self.stats is not None:
+                    self.stats.count('expanded', expanded)
+                if cost < minimal:
+                    minimal = cost
+                    result = [0] + path
+                    self.publish(result)
+
+        return result
+
+
+# search nodes kept as a struct of arrays, a node is just its index into them
+# only the coin and the parent are stored, the visited coins and the cost are recovered by following the parents
+class NodePool:
+    def __init__(self):
+        self.ids = array('H')
+        self.parents = array('i')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, id, parent=-1):
+        self.ids.append(id)
+        self.parents.append(parent)
+        return len(self.ids) - 1
+
+    # returns bitmask of coins visited on the way to the node and the cost of that way
+    def state(self, index, coin_distance):
+        ids, parents = self.ids, self.parents
+        id = ids[index]
+        visited, val = 1 << id, 0
+        while parents[index] >= 0:
+            index = parents[index]
+            val += coin_distance[ids[index]][id]
+            id = ids[index]
+            visited |= 1 << id
+        return visited, val
+
+    def path(self, index):
+        path = list()
+        while index >= 0:
+            path.append(self.ids[index])
+            index = self.parents[index]
+        return path
+
+    def nbytes(self):
+        return sys.getsizeof(self.ids) + sys.getsizeof(self.parents)
+
+    def count(self, stats, frontier, expanded):
+        stats.count('generated', len(self))
+        stats.count('expanded', expanded)
+        stats.peak('frontier_peak', max(frontier.peak, len(frontier)))
+        stats.peak('bytes_per_node', (self.nbytes() + frontier.nbytes()) / len(self))
+
+
+# priority queue for integer costs, entries of equal cost share one bucket array of packed 64 bit keys
+# a bucket is sorted only once it holds the lowest cost, lower keys are popped first
+class BucketQueue:
+    key_mask = (1 << 64) - 1
+
+    def __init__(self):
+        self.buckets = dict()
+        self.costs = []
+        self.ordered = set()
+        self.size = 0
+        self.peak = 0
+
+    def __len__(self):
+        return self.size
+
+    # keys are stored inverted, so a sorted bucket pops its lowest key from the end
+    def push(self, cost, key):
+        bucket = self.buckets.get(cost)
+        if bucket is None:
+            bucket = self.buckets[cost] = array('Q')
+            heapq.heappush(self.costs, cost)
+        if cost in self.ordered:
+            bucket.insert(bisect.bisect(bucket, self.key_mask ^ key), self.key_mask ^ key)
+        else:
+            bucket.append(self.key_mask ^ key)
+        self.size += 1
+
+    # the size only drops on pop, so checking the peak here is enough
+    def pop(self):
+        if self.size > self.peak:
+            self.peak = self.size
+        cost = self.costs[0]
+        bucket = self.buckets[cost]
+        if cost not in self.ordered:
+            bucket = self.buckets[cost] = array('Q', sorted(bucket))
+            self.ordered.add(cost)
+
+        key = self.key_mask ^ bucket.pop()
+        if not bucket:
+            del self.buckets[cost]
+            self.ordered.discard(cost)
+            heapq.heappop(self.costs)
+        self.size -= 1
+        return cost, key
+
+    def nbytes(self):
+        return (sys.getsizeof(self.buckets) + sys.getsizeof(self.costs) + sys.getsizeof(self.ordered)
+                + sum(sys.getsizeof(bucket) + sys.getsizeof(cost) for cost, bucket in self.buckets.items()))
+
+
+class Uki(Solver):
+    exact = True
+    # dominance - drop nodes that reach a coin with the same coins collected as an earlier node, at no lower cost
+    # closed_table_size - most (coin, unvisited) states remembered, new states past it are not checked
+    dominance = False
+    closed_table_size = 1 << 20
+
+    def get_agent_path(self, coin_distance):
+        # frontier - costs with 64 bit keys packing remaining (16 bits), id (16 bits) and node index (32 bits),
+        # the index keeps equal keys in insertion order
+        # unvisited - bitmask of coins that are yet to be collected
+        pool, frontier = NodePool(), BucketQueue()
+        full = (1 << len(coin_distance)) - 1
+        current = pool.add(0)
+        id, val, unvisited = 0, 0, full & ~1
+        expanded = 0
+        # nodes above the bound would only be popped after the optimal tour
+        bound = math.inf if self.upper_bound is None else self.upper_bound
+        # closed - cheapest cost found for each state, packed as unvisited << 16 | coin
+        # of equal nodes the first one is kept, it is also the one the tree search would expand first
+        dominance, closed = self.dominance, dict()
+        dominated = 0
+
+        while id != 0 or unvisited:
+            expanded += 1
+            if not unvisited:
+                unvisited = 1
+
+            key = unvisited.bit_count() << 16
+            row = coin_distance[id]
+            for i in range(len(coin_distance)):
+                if unvisited >> i & 1 and val + row[i] <= bound:
+                    if dominance:
+                        state = (unvisited & ~(1 << i)) << 16 | i
+                        cost = closed.get(state)
+                        if cost is not None and cost <= val + row[i]:
+                            dominated += 1
+                            continue
+                        if cost is not None or len(closed) < self.closed_table_size:
+                            closed[state] = val + row[i]
+                    frontier.push(val + row[i], (key | i) << 32 | pool.add(i, current))
+
+            # nodes a cheaper node reached the same state after were pushed are skipped
+            while True:
+                val, current = frontier.pop()
+                current &= 0xFFFFFFFF
+                id = pool.ids[current]
+                unvisited = full & ~pool.state(current, coin_distance)[0]
+                if not dominance or closed.get(unvisited << 16 | id, val) >= val:
+                    break
+                dominated += 1
+
+        if self.stats is not None:
+            pool.count(self.stats, frontier, expanded)
+            if dominance:
+                self.stats.count('dominated', dominated)
+                self.stats.count('closed_states', len(closed))
+        return pool.path(current)
+
+
+class UkiDominance(Uki):
+    dominance = True
+
+
+class Micko(Solver):
+    exact = True
+    mst_cache_size = 1 << 16
+
+    # unvisited - bitmask of coins spanned together with coin 0
+    def mst(self, coin_distance, unvisited):
+        stats = self.stats
+        if unvisited in self.mst_cache:
+            if stats is not None:
+                stats.count('cache_hits')
+            self.mst_cache.move_to_end(unvisited)
+            return self.mst_cache[unvisited]
+
+        if stats is not None:
+            start = time.perf_counter()
+
+        # keys - cheapest edge connecting each coin in nodes to the tree
+        nodes = [i for i in range(1, len(coin_distance)) if unvisited >> i & 1]
+        keys = [coin_distance[0][i] for i in nodes]
+
+        cost = 0
+        while nodes:
+            index = min(range(len(nodes)), key=keys.__getitem__)
+            cost += keys[index]
+            added = coin_distance[nodes[index]]
+
+            nodes[index], keys[index] = nodes[-1], keys[-1]
+            nodes.pop()
+            keys.pop()
+
+            for k, j in enumerate(nodes):
+                if keys[k] > added[j]:
+                    keys[k] = added[j]
+
+        self.mst_cache[unvisited] = cost
+        if len(self.mst_cache) > self.mst_cache_size:
+            self.mst_cache.popitem(last=False)
+
+        if stats is not None:
+            stats.count('heuristic_evals')
+            stats.add_time('heuristic', time.perf_counter() - start)
+
+        return cost
+
+    # lower bound on the rest of the tour from a coin in unvisited through all of them back to 0
+    # id - coin just removed from unvisited, the previous set of a node is unvisited | 1 << id
+    def heuristic(self, coin_distance, unvisited, id):
+        return self.mst(coin_distance, unvisited)
+
+    def get_agent_path(self, coin_distance):
+        self.mst_cache = OrderedDict()
+
+        pool, frontier = NodePool(), BucketQueue()
+        full = (1 << len(coin_distance)) - 1
+        current = pool.add(0)
+        id, val, unvisited = 0, 0, full & ~1
+        expanded = 0
+        # the heuristic never overestimates, so nodes above the bound would only be popped after the optimal tour
+        bound = math.inf if self.upper_bound is None else self.upper_bound
+
+        while id != 0 or unvisited:
+            expanded += 1
+            h = self.heuristic(coin_distance, unvisited, id)
+
+            if not unvisited:
+                unvisited = 1
+
+            key = unvisited.bit_count() << 16
+            row = coin_distance[id]
+            for i in range(len(coin_distance)):
+                if unvisited >> i & 1 and val + row[i] + h <= bound:
+                    frontier.push(val + row[i] + h, (key | i) << 32 | pool.add(i, current))
+
+            current = frontier.pop()[1] & 0xFFFFFFFF
+            id = pool.ids[current]
+            visited, val = pool.state(current, coin_distance)
+            unvisited = full & ~visited
+
+        if self.stats is not None:
+            pool.count(self.stats, frontier, expanded)
+        return pool.path(current)
+
+
+# Micko with the Held-Karp bound: the rest of the tour is a path through unvisited ending in 0, so with
+# penalties p added to both ends of every edge it costs at least the penalised spanning tree
+# minus sum(2p) plus p[0] plus the smallest penalty of a possible start, for any integer penalties
+# penalties are tuned by subgradient ascent towards degree 2 (1 for coin 0), starting from the ones of the parent
+class MickoOneTree(Micko):
+    iterations = 10
+    cold_iterations = 30
+
+    # nodes - coin 0 followed by the spanned coins, penalties - penalty of each coin in nodes
+    # return value - cost of the penalised minimum spanning tree and the degree of each coin in it
+    @staticmethod
+    def spanning_tree(coin_distance, nodes, penalties):
+        row = coin_distance[nodes[0]]
+        keys = [row[j] + penalties[0] + penalties[k] for k, j in enumerate(nodes)]
+        parents = [0] * len(nodes)
+        degrees = [0] * len(nodes)
+        rest = list(range(1, len(nodes)))
+
+        cost = 0
+        while rest:
+            index = min(range(len(rest)), key=lambda k: keys[rest[k]])
+            k = rest[index]
+            rest[index] = rest[-1]
+            rest.pop()
+
+            cost += keys[k]
+            degrees[k] += 1
+            degrees[parents[k]] += 1
+
+            row = coin_distance[nodes[k]]
+            for r in rest:
+                key = row[nodes[r]] + penalties[k] + penalties[r]
+                if key < keys[r]:
+                    keys[r] = key
+                    parents[r] = k
+
+        return cost, degrees
+
+    def heuristic(self, coin_distance, unvisited, id):
+        stats = self.stats
+        if unvisited in self.mst_cache:
+            if stats is not None:
+                stats.count('cache_hits')
+            self.mst_cache.move_to_end(unvisited)
+            return self.mst_cache[unvisited][0]
+
+        if stats is not None:
+            start = time.perf_counter()
+
+        nodes = [0] + [i for i in range(1, len(coin_distance)) if unvisited >> i & 1]
+        parent = self.mst_cache.get(unvisited | 1 << id)
+        if parent is None:
+            penalties, iterations = [0] * len(nodes), self.cold_iterations
+        else:
+            penalties, iterations = [parent[1].get(i, 0) for i in nodes], self.iterations
+
+        best, best_penalties = 0, penalties
+        if len(nodes) > 1:
+            step = None
+            for _ in range(iterations):
+                cost, degrees = MickoOneTree.spanning_tree(coin_distance, nodes, penalties)
+                bound = cost - 2 * sum(penalties) + penalties[0] + min(penalties[1:])
+                if bound > best:
+                    best, best_penalties = bound, penalties
+
+                gradient = [degree - 2 for degree in degrees]
+                gradient[0] += 1
+                if not any(gradient):
+                    break
+                if step is None:
+                    step = max(cost // (2 * len(nodes)), 1)
+                penalties = [p + step * g for p, g in zip(penalties, gradient)]
+                step = max(step * 3 // 4, 1)
+
+        self.mst_cache[unvisited] = best, dict(zip(nodes, best_penalties))
+        if len(self.mst_cache) > self.mst_cache_size:
+            self.mst_cache.popitem(last=False)
+
+        if stats is not None:
+            stats.count('heuristic_evals')
+            stats.add_time('heuristic', time.perf_counter() - start)
+
+        return best
+
+
+# tour - closed tour starting with 0, without the 0 at the end, improved in place
+# return value - whether the tour was improved
+def two_opt(coin_distance, tour, deadline=math.inf):
+    improved = False
+
+    for i in range(len(tour) - 2):
+        if time.time() > deadline:
+            break
+
+        a, b = tour[i], tour[i + 1]
+        for j in range(i + 2, len(tour) if i else len(tour) - 1):
+            c, d = tour[j], tour[(j + 1) % len(tour)]
+            if coin_distance[a][c] + coin_distance[b][d] < coin_distance[a][b] + coin_distance[c][d]:
+                tour[i + 1:j + 1] = tour[j:i:-1]
+                b = tour[i + 1]
+                improved = True
+
+    return improved
+
+
+# moves segments of up to three coins (possibly reversed) between two other neighbouring coins
+def or_opt(coin_distance, tour, deadline=math.inf):
+    improved = False
+
+    for length in (1, 2, 3):
+        i = 1
+        while i + length <= len(tour):
+            if time.time() > deadline:
+                return improved
+
+            first, last = tour[i], tour[i + length - 1]
+            prev, after = tour[i - 1], tour[(i + length) % len(tour)]
+            gain = coin_distance[prev][first] + coin_distance[last][after] - coin_distance[prev][after]
+
+            best = 0
+            move = None
+            for p in range(len(tour)):
+                if i - 1 <= p < i + length:
+                    continue
+
+                x, y = tour[p], tour[(p + 1) % len(tour)]
+                forward = gain - coin_distance[x][first] - coin_distance[last][y] + coin_distance[x][y]
+                backward = gain - coin_distance[x][last] - coin_distance[first][y] + coin_distance[x][y]
+                if forward > best:
+                    best, move = forward, (p, False)
+                if backward > best:
+                    best, move = backward, (p, True)
+
+            if move is None:
+                i += 1
+                continue
+
+            p, reverse = move
+            segment = tour[i:i + length]
+            if reverse:
+                segment.reverse()
+            del tour[i:i + length]
+            if p > i:
+                p -= length
+            tour[p + 1:p + 1] = segment
+            improved = True
+
+    return improved
+
+
+# 2-opt and Or-opt limited to the queued coins: the best 2-opt move at an edge of the coin, otherwise the best
+# place to move the coin to, coins whose edges change are queued again
+# limit - most moves made
+# return value - number of moves made
+def repair(coin_distance, tour, queue, deadline=math.inf, limit=math.inf):
+    queue = deque(queue)
+    queued = set(queue)
+    moves = 0
+
+    while queue and moves < limit and len(tour) > 3 and time.time() <= deadline:
+        coin = queue.popleft()
+        queued.discard(coin)
+        n = len(tour)
+        i = tour.index(coin)
+
+        best, move = 0, None
+        for p in ((i - 1) % n, i):
+            a, b = tour[p], tour[(p + 1) % n]
+            row_a, row_b = coin_distance[a], coin_distance[b]
+            skip = ((p - 1) % n, p, (p + 1) % n)
+            for q in range(n):
+                c, d = tour[q], tour[(q + 1) % n]
+                gain = row_a[b] + coin_distance[c][d] - row_a[c] - row_b[d]
+                if gain > best and q not in skip:
+                    best, move = gain, (min(p, q), max(p, q))
+
+        if move is not None:
+            p, q = move
+            changed = tour[p], tour[p + 1], tour[q], tour[(q + 1) % n]
+            tour[p + 1:q + 1] = tour[q:p:-1]
+        else:
+            if not coin:
+                continue
+            prev, after = tour[i - 1], tour[(i + 1) % n]
+            row = coin_distance[coin]
+            removal = coin_distance[prev][coin] + row[after] - coin_distance[prev][after]
+            for p in range(n):
+                if p in (i - 1, i):
+                    continue
+                x, y = tour[p], tour[(p + 1) % n]
+                gain = removal - coin_distance[x][coin] - row[y] + coin_distance[x][y]
+                if gain > best:
+                    best, move = gain, p
+            if move is None:
+                continue
+
+            changed = prev, after, tour[move], tour[(move + 1) % n], coin
+            del tour[i]
+            tour.insert(move if move > i else move + 1, coin)
+
+        moves += 1
+        for touched in changed:
+            if touched not in queued:
+                queued.add(touched)
+                queue.append(touched)
+
+    return moves
+
+
+class LocalSearch(Aki):
+    cacheable = False
+
+    def get_agent_path(self, coin_distance):
+        deadline = self.get_deadline()
+        with self.phase('construction'):
+            tour = super().get_agent_path(coin_distance)[:-1]
+        self.publish(tour + [0])
+
+        improved = True
+        while improved and time.time() < deadline:
+            with self.phase('two_opt'):
+                improved = two_opt(coin_distance, tour, deadline)
+            with self.phase('or_opt'):
+                improved = or_opt(coin_distance, tour, deadline) or improved
+            if self.stats is not None:
+                self.stats.count('passes')
+            if improved:
+                self.publish(tour + [0])
+
+        return tour + [0]
+
+
+# depth first search over tours, only the current path is kept, so memory stays linear in the number of coins
+# (besides the bounded MST cache); the first incumbent is Aki's tour improved by 2-opt and Or-opt
+class BranchAndBound(Micko):
+    def get_agent_path(self, coin_distance):
+        self.mst_cache = OrderedDict()
+
+        with self.phase('incumbent'):
+            tour = Aki.get_agent_path(self, coin_distance)[:-1]
+            while two_opt(coin_distance, tour) | or_opt(coin_distance, tour):
+                pass
+        result = tour + [0]
+        self.publish(result)
+
+        # limit - tours are only searched if they can cost less, a known upper bound without a tour lets
+        # tours of that cost through, one of them is then found
+        limit = cost_matrix(coin_distance).path_cost(result)
+        if self.upper_bound is not None and self.upper_bound < limit:
+            limit = self.upper_bound + 1
+        path = [0]
+        expanded = pruned = 0
+
+        # the rest of a tour from current is a spanning tree of unvisited and 0 together with its first coin,
+        # so all children share the bound of their parent and are cut off at the first one reaching the limit
+        def extend(current, cost, unvisited):
+            nonlocal limit, result, expanded, pruned
+            expanded += 1
+
+            row = coin_distance[current]
+            if not unvisited:
+                if cost + row[0] < limit:
+                    limit = cost + row[0]
+                    result = path + [0]
+                    self.publish(result)
+                return
+
+            h = self.mst(coin_distance, unvisited)
+            for i in sorted((i for i in range(len(coin_distance)) if unvisited >> i & 1), key=row.__getitem__):
+                if cost + row[i] + h >= limit:
+                    pruned += 1
+                    break
+                path.append(i)
+                extend(i, cost + row[i], unvisited & ~(1 << i))
+                path.pop()
+
+        with self.phase('search'):
+            extend(0, 0, (1 << len(coin_distance)) - 2)
+
+        if self.stats is not None:
+            self.stats.count('expanded', expanded)
+            self.stats.count('pruned', pruned)
+        return result
+
+
+# keeps the width cheapest partial tours at each depth, scored like Micko's nodes by their cost plus the spanning
+# tree of the coins left, so at most width * coins nodes are kept
+# width - partial tours kept, None to fit it to time_budget (default_width without a budget)
+# of partial tours ending in the same coin with the same coins left only the cheapest one is kept
+class BeamSearch(Micko):
+    exact = False
+    cacheable = False
+    width = None
+    default_width = 16
+    max_width = 4096
+
+    def get_agent_path(self, coin_distance):
+        self.mst_cache = OrderedDict()
+        deadline = self.get_deadline()
+        n = len(coin_distance)
+
+        with self.phase('construction'):
+            greedy = Aki.get_agent_path(self, coin_distance)
+        self.publish(greedy)
+
+        # beam - (cost with the estimate, cost, coin, node, unvisited) of every partial tour, cheapest first
+        pool = NodePool()
+        beam = [(0, 0, 0, pool.add(0), ((1 << n) - 1) & ~1)]
+        width = self.width or self.default_width
+        expanded = peak = 0
+
+        with self.phase('search'):
+            for depth in range(1, n):
+                if time.time() > deadline:
+                    break
+                start = time.perf_counter()
+
+                candidates = []
+                for _, val, id, node, unvisited in beam:
+                    h = self.mst(coin_distance, unvisited)
+                    row = coin_distance[id]
+                    for i in range(1, n):
+                        if unvisited >> i & 1:
+                            candidates.append((val + row[i] + h, val + row[i], i, node, unvisited))
+                expanded += len(beam)
+
+                # the width is fitted to the time left before the candidates are cut, a spanning tree of m coins
+                # takes about m * m steps and every partial tour needs one for each of the remaining depths
+                if not self.width and deadline != math.inf:
+                    m = n - depth
+                    rate = (time.perf_counter() - start) / (len(beam) * m * m)
+                    work = (m - 1) * m * (2 * m - 1) // 6
+                    if work and rate:
+                        width = max(1, min(self.max_width, int((deadline - time.time()) / (rate * work))))
+                candidates.sort()
+
+                seen = set()
+                next_beam = []
+                for estimate, val, i, node, unvisited in candidates:
+                    unvisited &= ~(1 << i)
+                    if unvisited << 16 | i in seen:
+                        continue
+                    seen.add(unvisited << 16 | i)
+                    next_beam.append((estimate, val, i, pool.add(i, node), unvisited))
+                    if len(next_beam) == width:
+                        break
+
+                beam = next_beam
+                peak = max(peak, len(beam))
+
+        # past the deadline the cheapest partial tour is finished by always going to the nearest coin,
+        # Aki's tour is kept if that ends up worse
+        _, val, id, node, unvisited = beam[0]
+        path = pool.path(node)[::-1]
+        while unvisited:
+            row = coin_distance[path[-1]]
+            path.append(min((i for i in range(1, n) if unvisited >> i & 1), key=row.__getitem__))
+            unvisited &= ~(1 << path[-1])
+        path.append(0)
+
+        if self.stats is not None:
+            self.stats.count('generated', len(pool))
+            self.stats.count('expanded', expanded)
+            self.stats.peak('width', peak)
+        return min(path, greedy, key=cost_matrix(coin_distance).path_cost)
+
+
+class HeldKarp(Solver):
+    exact = True
+    chunk_size = 1 << 16
+
+    def get_agent_path(self, coin_distance):
+        import numpy
+
+        # coins 1..n-1 are bits 0..m-1 of a subset mask
+        m = len(coin_distance) - 1
+        if not m:
+            return [0, 0]
+
+        inf = numpy.iinfo(numpy.int32).max // 2
+        distance = numpy.frombuffer(dense_matrix(coin_distance).values, dtype=numpy.int32).reshape(m + 1, m + 1)
+        inner = distance[1:, 1:]
+
+        masks = numpy.arange(1 << m, dtype=numpy.int32)
+        sizes = numpy.zeros(1 << m, dtype=numpy.int8)
+        for bit in range(m):
+            sizes += (masks >> bit & 1).astype(numpy.int8)
+
+        # index - position of a subset within the layer of subsets of the same size
+        # cost[s, j] - cheapest path from 0 through subset s ending in j, parents[k][s, j] - coin before j
+        index = numpy.empty(1 << m, dtype=numpy.int32)
+        layer = masks[sizes == 1]
+        index[layer] = numpy.arange(len(layer))
+        cost = numpy.full((len(layer), m), inf, dtype=numpy.int32)
+        cost[index[1 << numpy.arange(m)], numpy.arange(m)] = distance[0, 1:]
+        parents = [None, None]
+
+        with self.phase('table'):
+            for k in range(2, m + 1):
+                layer = masks[sizes == k]
+                if self.stats is not None:
+                    self.stats.count('states', len(layer) * k)
+                index[layer] = numpy.arange(len(layer))
+                layer_cost = numpy.full((len(layer), m), inf, dtype=numpy.int32)
+                layer_parent = numpy.zeros((len(layer), m), dtype=numpy.int8)
+
+                for j in range(m):
+                    rows = numpy.flatnonzero(layer >> j & 1)
+                    for start in range(0, len(rows), self.chunk_size):
+                        chunk = rows[start:start + self.chunk_size]
+                        candidates = cost[index[layer[chunk] ^ (1 << j)]] + inner[:, j]
+                        best = candidates.argmin(axis=1)
+                        layer_cost[chunk, j] = candidates[numpy.arange(len(chunk)), best]
+                        layer_parent[chunk, j] = best
+
+                cost = layer_cost
+                parents.append(layer_parent)
+
+        with self.phase('path'):
+            mask = (1 << m) - 1
+            current = int((cost[0] + distance[1:, 0]).argmin())
+
+            path = list()
+            for k in range(m, 0, -1):
+                path.append(current + 1)
+                previous = int(parents[k][index[mask], current]) if k > 1 else None
+                mask ^= 1 << current
+                current = previous
+
+        return [0] + path[::-1] + [0]
+
+
+class LinKernighan(Aki):
+    cacheable = False
+    neighbours = 8
+    # tour - coins in tour order while improving, position - index of each coin in tour
+    tour = None
+    position = None
+
+    def succ(self, coin):
+        return self.tour[(self.position[coin] + 1) % len(self.tour)]
+
+    def pred(self, coin):
+        return self.tour[self.position[coin] - 1]
+
+    def get_tour(self):
+        start = self.position[0]
+        return self.tour[start:] + self.tour[:start] + [0]
+
+    # reverses the path first ... last, or the rest of the tour if that is shorter
+    def reverse(self, first, last):
+        i, j = self.position[first], self.position[last]
+        length = (j - i) % len(self.tour) + 1
+        if 2 * length > len(self.tour):
+            i, j = (j + 1) % len(self.tour), (i - 1) % len(self.tour)
+            length = len(self.tour) - length
+
+        for _ in range(length // 2):
+            a, b = self.tour[i], self.tour[j]
+            self.tour[i], self.tour[j] = b, a
+            self.position[a], self.position[b] = j, i
+            i, j = (i + 1) % len(self.tour), (j - 1) % len(self.tour)
+
+    # replaces edges (t1, t2) and (t3, t4) with (t1, t3) and (t2, t4), t2 and t4 follow t1 and t3 in the same direction
+    def move(self, t1, t2, t3, t4):
+        if self.succ(t1) == t2:
+            self.reverse(t2, t3)
+        else:
+            self.reverse(t3, t2)
+
+    def improve_two_opt(self, coin_distance, candidates, t1):
+        for t2 in (self.succ(t1), self.pred(t1)):
+            removed = coin_distance[t1][t2]
+            for t3 in candidates[t1]:
+                added = coin_distance[t1][t3]
+                if added >= removed:
+                    break
+
+                t4 = self.succ(t3) if t2 == self.succ(t1) else self.pred(t3)
+                if t3 == t2 or t4 == t1:
+                    continue
+
+                if added + coin_distance[t2][t4] < removed + coin_distance[t3][t4]:
+                    self.move(t1, t2, t3, t4)
+                    return t1, t2, t3, t4
+
+        return None
+
+    # moves up to three coins starting at s1 next to one of the candidates of s1
+    def improve_or_opt(self, coin_distance, candidates, s1):
+        for forward in (True, False):
+            after, before = (self.succ, self.pred) if forward else (self.pred, self.succ)
+            segment = [s1]
+            for _ in range(3):
+                s2 = segment[-1]
+                p, q = before(s1), after(s2)
+                if q in segment or p in segment or p == q:
+                    break
+
+                gain = coin_distance[p][s1] + coin_distance[s2][q] - coin_distance[p][q]
+                for x in candidates[s1]:
+                    if coin_distance[s1][x] >= gain:
+                        break
+                    if x in segment or x in (p, q):
+                        continue
+
+                    for y in (after(x), before(x)):
+                        if y in segment or y in (p, q):
+                            continue
+
+                        if coin_distance[x][s1] + coin_distance[s2][y] - coin_distance[x][y] < gain:
+                            # x, y in the direction of the segment need a third move to keep s1 next to x
+                            if y == after(x):
+                                self.move(p, s1, x, y)
+                                self.move(p, x, q, s2)
+                                self.move(x, s2, s1, y)
+                            else:
+                                self.move(p, s1, y, x)
+                                self.move(p, y, q, s2)
+                            return p, q, x, y, s1, s2
+
+                segment.append(q)
+
+        return None
+
+    def get_agent_path(self, coin_distance):
+        deadline = self.get_deadline()
+        with self.phase('construction'):
+            tour = super().get_agent_path(coin_distance)[:-1]
+        self.publish(tour + [0])
+
+        if len(tour) < 8:
+            while two_opt(coin_distance, tour) | or_opt(coin_distance, tour):
+                pass
+            return tour + [0]
+
+        # building the candidates takes a while on large maps, past the deadline the constructed tour is returned
+        # coordinate maps take them from a grid instead of whole rows
+        with self.phase('candidates'):
+            grid = coin_distance.grid(range(len(coin_distance))) if isinstance(coin_distance, PointMatrix) else None
+            candidates = []
+            for i in range(len(coin_distance)):
+                if time.time() > deadline:
+                    return tour + [0]
+                if grid is not None:
+                    candidates.append(grid.neighbours(i, self.neighbours))
+                    continue
+                row = coin_distance[i]
+                nearest = sorted(heapq.nsmallest(self.neighbours + 1, range(len(row)), key=row.__getitem__),
+                                 key=row.__getitem__)
+                candidates.append([j for j in nearest if j != i][:self.neighbours])
+
+        # active - coins whose don't-look bit is off, queue - active coins in the order they are checked
+        self.tour = tour
+        self.position = [0] * len(tour)
+        for i, coin in enumerate(tour):
+            self.position[coin] = i
+        active = [True] * len(tour)
+        queue = deque(tour)
+
+        with self.phase('improvement'):
+            # improvements are published once per len(tour) checked coins
+            checked = moves = 0
+            improved = False
+            while queue and time.time() < deadline:
+                coin = queue.popleft()
+                active[coin] = False
+
+                changed = self.improve_two_opt(coin_distance, candidates, coin) or \
+                    self.improve_or_opt(coin_distance, candidates, coin)
+                if changed:
+                    moves += 1
+                    improved = True
+                    for touched in changed + (coin,):
+                        if not active[touched]:
+                            active[touched] = True
+                            queue.append(touched)
+
+                checked += 1
+                if improved and not checked % len(tour):
+                    self.publish(self.get_tour())
+                    improved = False
+
+        if self.stats is not None:
+            self.stats.count('checked', checked)
+            self.stats.count('moves', moves)
+
+        path = self.get_tour()
+        self.tour = self.position = None
+
+        return path
@@ -1,11 +1,9 @@
 import math
-import random
 
 import pygame
 import os
 import config
-
-import itertools
+import solvers
 
 
 class BaseSprite(pygame.sprite.Sprite):
@@ -36,6 +34,7 @@ class Surface(BaseSprite):
 class Coin(BaseSprite):
     def __init__(self, x, y, ident):
         self.ident = ident
+        self.label = None
         super(Coin, self).__init__(x, y, 'coin.png', config.DARK_GREEN)
 
     def get_ident(self):
@@ -44,25 +43,28 @@ class Coin(BaseSprite):
     def position(self):
         return self.rect.x, self.rect.y
 
+    # the label is rendered once and reused on every draw
     def draw(self, screen):
-        text = config.COIN_FONT.render(f'{self.ident}', True, config.BLACK)
-        text_rect = text.get_rect(center=self.rect.center)
-        screen.blit(text, text_rect)
+        if self.label is None:
+            self.label = config.COIN_FONT.render(f'{self.ident}', True, config.BLACK)
+        screen.blit(self.label, self.label.get_rect(center=self.rect.center))
 
 
 class CollectedCoin(BaseSprite):
     def __init__(self, coin):
         self.ident = coin.ident
+        self.label = None
         super(CollectedCoin, self).__init__(coin.rect.x,
                                             coin.rect.y, 'collected_coin.png', config.DARK_GREEN)
 
     def draw(self, screen):
-        text = config.COIN_FONT.render(f'{self.ident}', True, config.RED)
-        text_rect = text.get_rect(center=self.rect.center)
-        screen.blit(text, text_rect)
+        if self.label is None:
+            self.label = config.COIN_FONT.render(f'{self.ident}', True, config.RED)
+        screen.blit(self.label, self.label.get_rect(center=self.rect.center))
 
 
-class Agent(BaseSprite):
+# the search itself comes from the solver classes in solvers.py, an agent adds the sprite that travels the path
+class Agent(BaseSprite, solvers.Solver):
     def __init__(self, x, y, file_name):
         super(Agent, self).__init__(x, y, file_name, config.DARK_GREEN)
         self.x = self.rect.x
@@ -97,6 +99,24 @@ class Agent(BaseSprite):
             self.y = self.destinationY
             self.travelling = False
 
+    # agents are sent to the solver process without their pygame image and groups
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items() if key not in ('_Sprite__g', 'image', 'rect')}
+
+    # solver class get_agent_path comes from, None if an agent class writes its own
+    @classmethod
+    def solver_class(cls):
+        solver = next(class_ for class_ in cls.__mro__
+                      if issubclass(class_, solvers.Solver) and not issubclass(class_, Agent))
+        return solver if solver.get_agent_path is cls.get_agent_path else None
+
+    # agents are unpickled as their solver class, so the solver process does not import pygame
+    def __reduce_ex__(self, protocol):
+        solver = self.solver_class()
+        if solver is None:
+            return super().__reduce_ex__(protocol)
+        return solver, (), self.__getstate__()
+
     def is_travelling(self):
         return self.travelling
 
@@ -104,157 +124,62 @@ class Agent(BaseSprite):
         self.x = self.destinationX = self.rect.x = position[0]
         self.y = self.destinationX = self.rect.y = position[1]
 
-    # coin_distance - cost matrix
-    # return value - list of coin identifiers (containing 0 as first and last element, as well)
-    def get_agent_path(self, coin_distance):
-        pass
-
 
-class ExampleAgent(Agent):
+class ExampleAgent(Agent, solvers.ExampleAgent):
     def __init__(self, x, y, file_name):
         super().__init__(x, y, file_name)
 
-    def get_agent_path(self, coin_distance):
-        path = [i for i in range(1, len(coin_distance))]
-        random.shuffle(path)
-        return [0] + path + [0]
-
 
-class Aki(Agent):
+class Aki(Agent, solvers.Aki):
     def __init__(self, x, y, file_name):
         super().__init__(x, y, file_name)
 
-    def get_agent_path(self, coin_distance):
-        unvisited = [i for i in range(1, len(coin_distance))]
-
-        path = list()
-
-        current = 0
-        while unvisited:
-            minimal = math.inf
-            index = -1
-
-            for node in unvisited:
-                value = coin_distance[current][node]
-
-                if value < minimal:
-                    minimal = value
-                    index = node
-
-            current = index
-            unvisited.remove(index)
-            path.append(index)
 
-        return [0] + path + [0]
-
-
-class Jocke(Agent):
+class Jocke(Agent, solvers.Jocke):
     def __init__(self, x, y, file_name):
         super().__init__(x, y, file_name)
 
-    def get_agent_path(self, coin_distance):
-        minimal = math.inf
-
-        for perm in itertools.permutations([i for i in range(1, len(coin_distance))]):
-            perm = list(perm) + [0]
-
-            current = 0
-            cost = 0
-
-            for node in perm:
-                cost += coin_distance[current][node]
-                current = node
-
-            if cost < minimal:
-                path = perm
-                minimal = cost
-
-        return [0] + path
-
-
-class Node:
-    def __init__(self, id, val, unvisited, parent=None, h=0):
-        self.id = id
-
-        self.val = val
-        self.h = h
-
-        self.unvisited = unvisited
-        self.parent = parent
 
-
-class Uki(Agent):
+class Uki(Agent, solvers.Uki):
     def __init__(self, x, y, file_name):
         super().__init__(x, y, file_name)
 
-    def get_agent_path(self, coin_distance):
-        next = [current := Node(0, 0, [i for i in range(1, len(coin_distance))])]
-
-        while current.id != 0 or current.unvisited:
-            next.remove(current)
-
-            if not current.unvisited:
-                current.unvisited = [0]
-
-            for i in current.unvisited:
-                next.append(Node(i, current.val + coin_distance[current.id][i], current.unvisited, current))
-
-            current = min(next, key=lambda d: (d.val, len(d.unvisited), d.id))
-            current.unvisited = [x for x in current.unvisited if x != current.id]
-
-        path = list()
-        while current:
-            path.append(current.id)
-            current = current.parent
 
-        return path
-
-
-class Micko(Agent):
+class UkiDominance(Agent, solvers.UkiDominance):
     def __init__(self, x, y, file_name):
         super().__init__(x, y, file_name)
 
-    def mst(self, coin_distance, unvisited):
-        unvisited = unvisited.copy()
 
-        cost = 0
-        visited = [0]
+class Micko(Agent, solvers.Micko):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
 
-        while unvisited:
-            minimum = math.inf
 
-            for i in visited:
-                for j in unvisited:
-                    if minimum > coin_distance[i][j]:
-                        minimum = coin_distance[i][j]
-                        removal = j
+class MickoOneTree(Agent, solvers.MickoOneTree):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
 
-            cost += minimum
-            unvisited.remove(removal)
-            visited.append(removal)
 
-        return cost
+class LocalSearch(Agent, solvers.LocalSearch):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
 
-    def get_agent_path(self, coin_distance):
-        next = [current := Node(0, 0, [i for i in range(1, len(coin_distance))])]
 
-        while current.id != 0 or current.unvisited:
-            next.remove(current)
+class BranchAndBound(Agent, solvers.BranchAndBound):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
 
-            h = self.mst(coin_distance, current.unvisited)
 
-            if not current.unvisited:
-                current.unvisited = [0]
+class BeamSearch(Agent, solvers.BeamSearch):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
 
-            for i in current.unvisited:
-                next.append(Node(i, current.val + coin_distance[current.id][i], current.unvisited, current, h))
 
-            current = min(next, key=lambda d: (d.val + d.h, len(d.unvisited), d.id))
-            current.unvisited = [x for x in current.unvisited if x != current.id]
+class HeldKarp(Agent, solvers.HeldKarp):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
 
-        path = list()
-        while current:
-            path.append(current.id)
-            current = current.parent
 
-        return path
+class LinKernighan(Agent, solvers.LinKernighan):
+    def __init__(self, x, y, file_name):
+        super().__init__(x, y, file_name)
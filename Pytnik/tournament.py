@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+import config
+from benchmark import default_maps, make_agent, map_label, print_result, profile_prefix, set_gaps, solver_result, \
+    write_results
+from mapfile import load_map
+from util import SolverProcess, Timeout, profile_kinds
+
+STATUSES = ['ok', 'timeout', 'memory', 'error', 'invalid']
+
+
+# runs every (map, agent, repeat) job, at most workers solver processes at a time
+# memory_limit - bytes of address space each job may use
+# profile - kinds of profiles to write for every job, see util.profiled
+def run_tournament(agent_names, map_names, repeats=1, time_limit=60., memory_limit=None, workers=None,
+                   best_known=None, context=None, profile=()):
+    workers = workers or os.cpu_count()
+    maps = dict()
+    for map_name in map_names:
+        name = map_label(map_name)
+        if name in maps:
+            raise ValueError(f'Map {name} is given more than once')
+        maps[name] = load_map(map_name)[2]
+    # the largest maps go first, so the longest jobs do not end up last on an otherwise idle pool
+    jobs = deque(sorted(((name, agent_name, repeat) for name in maps for agent_name in agent_names
+                         for repeat in range(repeats)), key=lambda job: -len(maps[job[0]])))
+
+    results = []
+    running = []
+    while jobs or running:
+        while jobs and len(running) < workers:
+            name, agent_name, repeat = job = jobs.popleft()
+            agent = make_agent(agent_name, time_limit)
+            # jobs share the machine, so agents that start their own worker processes get a single one
+            if hasattr(agent, 'workers'):
+                agent.workers = 1
+            solver = SolverProcess(time_limit, agent, maps[name], context, memory_limit,
+                                   profile_prefix(profile, name, agent_name, repeat))
+            solver.start()
+            running.append((job, agent, solver))
+
+        remaining = min(solver.start_time + solver.max_time_sec - time.time() for _, _, solver in running)
+        wait([solver.conn for _, _, solver in running], max(min(remaining, 1.), 0))
+
+        still_running = []
+        for job, agent, solver in running:
+            try:
+                finished = solver.wait(0)
+            except Timeout:
+                finished = True
+            if not finished:
+                still_running.append((job, agent, solver))
+                continue
+
+            solver.close()
+            name, agent_name, repeat = job
+            result = solver_result(agent_name, agent, solver, maps[name])
+            result.update(map=name, coins=len(maps[name]) - 1, repeat=repeat)
+            results.append(result)
+            print_result(result)
+        running = still_running
+
+    best_known = dict(best_known or {})
+    set_gaps(results, best_known)
+    return results, best_known
+
+
+# per agent - runs, count of every status, wins (maps where it found the best cost), mean gap of the runs
+# that returned a tour and mean time of the finished ones
+def leaderboard(results):
+    best = dict()
+    for result in results:
+        if result['cost'] is not None:
+            key = result['map'], result['agent']
+            best[key] = min(best.get(key, result['cost']), result['cost'])
+    map_best = dict()
+    for (name, _), cost in best.items():
+        map_best[name] = min(map_best.get(name, cost), cost)
+
+    rows = dict()
+    for result in results:
+        row = rows.setdefault(result['agent'], {'agent': result['agent'], 'runs': 0, 'wins': 0,
+                                                **{status: 0 for status in STATUSES}})
+        row['runs'] += 1
+        row[result['status']] += 1
+    for (name, agent_name), cost in best.items():
+        if cost == map_best[name]:
+            rows[agent_name]['wins'] += 1
+
+    for row in rows.values():
+        gaps = [result['gap'] for result in results if result['agent'] == row['agent'] and result['gap'] is not None]
+        times = [result['time'] for result in results if result['agent'] == row['agent'] and result['status'] == 'ok']
+        row['mean_gap'] = sum(gaps) / len(gaps) if gaps else None
+        row['mean_time'] = sum(times) / len(times) if times else None
+
+    return sorted(rows.values(), key=lambda row: (-row['wins'], row['runs'] - row['ok'],
+                                                  float('inf') if row['mean_gap'] is None else row['mean_gap']))
+
+
+def print_leaderboard(rows):
+    print(f'{"agent":>14} {"runs":>5} {"wins":>5} ' + ' '.join(f'{status:>7}' for status in STATUSES) +
+          f' {"gap":>8} {"time":>9}')
+    for row in rows:
+        gap = '-' if row['mean_gap'] is None else f'{100 * row["mean_gap"]:.2f}%'
+        elapsed = '-' if row['mean_time'] is None else f'{row["mean_time"]:.3f}s'
+        print(f'{row["agent"]:>14} {row["runs"]:>5} {row["wins"]:>5} ' +
+              ' '.join(f'{row[status]:>7}' for status in STATUSES) + f' {gap:>8} {elapsed:>9}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs every agent on every map in parallel and ranks the agents.')
+    parser.add_argument('-a', '--agents', nargs='+', required=True, help='agent class names from solvers.py')
+    parser.add_argument('-m', '--maps', nargs='+', help='map files, all maps in the map folder by default')
+    parser.add_argument('-r', '--repeats', type=int, default=1)
+    parser.add_argument('-t', '--time-limit', type=float, default=60., help='seconds per job')
+    parser.add_argument('-M', '--memory-limit', type=int, help='megabytes of address space per job')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='jobs run at the same time')
+    parser.add_argument('-o', '--output', default='tournament.json', help='.json or .csv file for the results')
+    parser.add_argument('-l', '--leaderboard', help='JSON file for the leaderboard')
+    parser.add_argument('-p', '--profile', nargs='?', const='cpu,memory', default=config.PROFILE,
+                        help='profile the jobs with cProfile and tracemalloc: cpu, memory or both (default)')
+    args = parser.parse_args()
+
+    memory_limit = None if args.memory_limit is None else args.memory_limit << 20
+    results, _ = run_tournament(args.agents, args.maps or default_maps(), args.repeats, args.time_limit,
+                                memory_limit, args.workers, profile=profile_kinds(args.profile))
+    write_results(results, args.output)
+
+    rows = leaderboard(results)
+    print_leaderboard(rows)
+    if args.leaderboard:
+        with open(args.leaderboard, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
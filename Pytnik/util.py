@@ -1,46 +1,252 @@
-import ctypes
+import contextlib
+import multiprocessing
+import os
+import signal
+import sys
 import time
-from threading import Timer, Thread
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+from matrix import CostMatrix, dense_matrix
+from points import PointMatrix
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 
 class Timeout(Exception):
     pass
 
 
-def send_thread_exception(*args):
-    for t_id in args:
-        res = ctypes.pythonapi.PyThreadState_SetAsyncExc(
-            ctypes.c_long(t_id), ctypes.py_object(Timeout))
-        if not res:
-            print(f'ERR: Thread {t_id} not found')
-        if res > 1:
-            ctypes.pythonapi.PyThreadState_SetAsyncExc(t_id, 0)
-            print(f'ERR: Failed to send exception to thread {t_id}')
+# search counters an agent fills while it runs, phases holds seconds spent in each named part of the search
+class SearchStats:
+    def __init__(self):
+        self.counters = dict()
+        self.phases = dict()
 
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
 
-class TimedFunction(Thread):
-    def __init__(self, parent_id, queue, max_time_sec, method, *args):
-        super().__init__()
-        self.parent_id = parent_id
-        self.queue = queue
-        self.max_time_sec = max_time_sec
-        self.method = method
-        self.args = args
+    def peak(self, name, value):
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
 
-    def get_id(self):
-        return self.ident
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.) + seconds
 
-    def run(self) -> None:
-        timer = Timer(interval=self.max_time_sec,
-                      function=send_thread_exception, args=[self.ident, self.parent_id])
-        timer.start()
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
         try:
-            start_time = time.time()
-            result = self.method(*self.args)
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            self.queue.put((result, elapsed_time), block=False)
-        except (Timeout, Exception):
-            pass
+            yield
         finally:
-            timer.cancel()
+            self.add_time(name, time.perf_counter() - start)
+
+    @staticmethod
+    def from_dict(values):
+        stats = SearchStats()
+        stats.counters = dict(values['counters'])
+        stats.phases = dict(values['phases'])
+        return stats
+
+    def as_dict(self):
+        return {'counters': {name: round(value, 3) if isinstance(value, float) else value
+                             for name, value in self.counters.items()},
+                'phases': {name: round(value, 6) for name, value in self.phases.items()}}
+
+    # (name, value) pairs for the sidebar
+    def lines(self):
+        lines = [(name, f'{value:.1f}' if isinstance(value, float) else str(value))
+                 for name, value in self.counters.items()]
+        return lines + [(f'{name} s', f'{value:.3f}') for name, value in self.phases.items()]
+
+
+PROFILE_KINDS = ('cpu', 'memory')
+
+
+# value - comma separated profile kinds, 1 or all for both, empty or 0 for none
+# return value - tuple of the kinds to profile
+def profile_kinds(value):
+    value = value.strip().lower()
+    if value in ('', '0'):
+        return ()
+    if value in ('1', 'all'):
+        return PROFILE_KINDS
+    kinds = tuple(kind.strip() for kind in value.split(','))
+    for kind in kinds:
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f'Unknown profile kind {kind!r}, expected cpu, memory or both')
+    return kinds
+
+
+# runs the enclosed code under cProfile (cpu) and tracemalloc (memory), the reports are written to
+# prefix.pstats and prefix-memory.txt, only the calling process is profiled, not the workers it starts
+@contextlib.contextmanager
+def profiled(prefix, kinds, top=25):
+    import cProfile
+    import tracemalloc
+
+    os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+    profiler = cProfile.Profile() if 'cpu' in kinds else None
+    if 'memory' in kinds:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(prefix + '.pstats')
+        if 'memory' in kinds:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(prefix + '-memory.txt', 'w') as f:
+                f.write(f'current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n')
+                f.write(f'top {top} allocation sites by size:\n')
+                for stat in snapshot.statistics('lineno')[:top]:
+                    f.write(f'{stat}\n')
+
+
+# peak resident memory of the current process in kilobytes, None where the platform does not report it
+def peak_memory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+# runs in the solver process, messages go back through conn
+# source - name of the shared memory holding the cost matrix, or the PointMatrix of a coordinate map,
+# which is small enough to be sent as it is
+# deadline - time at which the solver is killed, the agent's time budget is what is left of it
+# memory_limit - bytes of address space the solver may use, unlimited if None or not supported by the platform
+# profile - (report path prefix, profile kinds) to profile get_agent_path with, None to run it as it is
+def run_solver(agent, source, size, conn, deadline, memory_limit=None, profile=None):
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    shm = SharedMemory(source) if isinstance(source, str) else None
+    coin_distance = source
+    try:
+        if shm is not None:
+            coin_distance = CostMatrix.from_buffer(shm.buf, size)
+        agent.publish = lambda path: conn.send(('incumbent', list(path)))
+        if agent.time_budget is not None:
+            agent.time_budget = deadline - time.time()
+        start_time = time.time()
+        if profile is None:
+            result = agent.get_agent_path(coin_distance)
+        else:
+            with profiled(*profile):
+                result = agent.get_agent_path(coin_distance)
+        conn.send(('result', result, time.time() - start_time, peak_memory(), agent.stats))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        try:
+            if not isinstance(coin_distance, str):
+                coin_distance.release()
+            if shm is not None:
+                shm.close()
+        except BufferError:
+            pass
+
+
+class SolverProcess:
+    # context - multiprocessing start method, the platform default if None
+    # memory_limit and profile - passed on to run_solver
+    def __init__(self, max_time_sec, agent, coin_distance, context=None, memory_limit=None, profile=None):
+        self.max_time_sec = max_time_sec
+        self.memory_limit = memory_limit
+        self.profile = profile
+        self.agent = agent
+        self.context = multiprocessing.get_context(context)
+        self.start_time = None
+        self.end_time = None
+        self.result = None
+        self.peak_memory = None
+        self.error = None
+
+        # coordinate maps are sent to the solver as they are, other cost matrices through shared memory
+        size = len(coin_distance)
+        self.shm = None
+        self.source = coin_distance
+        if not isinstance(coin_distance, PointMatrix):
+            self.shm = SharedMemory(create=True, size=max(4 * size * size, 4))
+            values = self.shm.buf[:4 * size * size].cast('i')
+            values[:] = dense_matrix(coin_distance).values
+            values.release()
+            self.source = self.shm.name
+
+        self.size = size
+        self.closed = False
+        self.conn = None
+        self.process = None
+
+    def start(self):
+        self.start_time = time.time()
+        self.conn, child_conn = self.context.Pipe(duplex=False)
+        self.process = self.context.Process(target=run_solver, args=(
+            self.agent, self.source, self.size, child_conn, self.start_time + self.max_time_sec, self.memory_limit,
+            self.profile))
+        self.process.start()
+        child_conn.close()
+
+    # waits up to timeout seconds for the solver, incumbents it publishes are stored in agent.incumbent
+    # return value - whether the solver finished (with result or error), raises Timeout past max_time_sec
+    def wait(self, timeout):
+        remaining = self.start_time + self.max_time_sec - time.time()
+        ready = self.conn.poll(max(min(timeout, remaining), 0))
+        while ready:
+            try:
+                message = self.conn.recv()
+            except EOFError:
+                message = ('error', f'Solver process exited with code {self.process.exitcode}')
+
+            if message[0] == 'incumbent':
+                self.agent.incumbent = message[1]
+            else:
+                if message[0] == 'result':
+                    self.result = message[1], message[2]
+                    self.peak_memory = message[3]
+                    self.agent.stats = message[4]
+                else:
+                    self.error = message[1]
+                self.close()
+                return True
+
+            ready = self.conn.poll()
+
+        if time.time() - self.start_time > self.max_time_sec:
+            self.close()
+            raise Timeout
+        return False
+
+    # kills the solver together with any processes it started
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.start_time is not None:
+            self.end_time = time.time()
+
+        if self.process is not None:
+            if self.process.is_alive():
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except (AttributeError, OSError):
+                    self.process.kill()
+            self.process.join()
+            self.conn.close()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None